@@ -0,0 +1,82 @@
+"""
+Compare full decode against draft decode in compose_collage.
+
+Each measurement runs in a fresh interpreter so peak RSS is not polluted by
+the other mode. The source image is generated in a child as well, since
+Linux carries the parent's RSS high-water mark over into forked children.
+
+Usage:
+
+    python benchmarks/bench_decode.py --megapixels 24 --size 1080x1920
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw
+from collage.layouts import layout_five_two_three
+from collage.renderer import compose_collage
+
+def make_image(path, megapixels):
+    w = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    h = int(w * 3 / 4)
+    img = Image.linear_gradient('L').resize((w, h)).convert('RGB')
+    draw = ImageDraw.Draw(img)
+    for i in range(0, w, w // 12):
+        draw.ellipse((i, i * h // w, i + w // 16, i * h // w + w // 16), fill=(200, 40, 90))
+    img.save(path, quality=90)
+
+def run_once(image_path, output_size, draft):
+    start = time.perf_counter()
+    positions = layout_five_two_three(output_size)
+    compose_collage([image_path] * 5, positions, output_size, draft=draft)
+    wall = time.perf_counter() - start
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        rss *= 1024
+    print(json.dumps({'wall': wall, 'peak_rss': rss}))
+
+def measure(image_path, size, draft):
+    cmd = [sys.executable, __file__, '--child', image_path, '--size', size]
+    if not draft:
+        cmd.append('--no-draft')
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    return json.loads(out)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark draft decoding in compose_collage.')
+    parser.add_argument('--megapixels', type=float, default=24)
+    parser.add_argument('--size', default='1080x1920')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--make', help=argparse.SUPPRESS)
+    parser.add_argument('--no-draft', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    w, h = map(int, args.size.lower().split('x'))
+
+    if args.make:
+        make_image(args.make, args.megapixels)
+        return
+    if args.child:
+        run_once(args.child, (w, h), not args.no_draft)
+        return
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'source.jpg')
+        subprocess.run([sys.executable, __file__, '--make', path, '--megapixels', str(args.megapixels)], check=True)
+        for label, draft in (('full', False), ('draft', True)):
+            runs = [measure(path, args.size, draft) for _ in range(args.repeat)]
+            wall = min(r['wall'] for r in runs)
+            rss = max(r['peak_rss'] for r in runs)
+            print(f'{label:>6}: wall {wall:.3f}s  peak RSS {rss / 2**20:.1f} MiB')
+
+if __name__ == '__main__':
+    main()
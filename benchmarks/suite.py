@@ -0,0 +1,255 @@
+"""
+Benchmark suite for layouts, rendering, validation and the CLI.
+
+Synthetic inputs are generated locally. Every case runs in a fresh
+interpreter and records wall time, CPU time and peak RSS; results are
+written as JSON and can be compared against a stored baseline.
+
+Usage:
+
+    python benchmarks/suite.py -o results.json
+    python benchmarks/suite.py -o new.json --baseline results.json --threshold 0.15
+    python benchmarks/suite.py --compare results.json new.json
+    python benchmarks/suite.py --list
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import Image, ImageDraw
+from collage.compositor import TileStyle, paint_frame, photo_rect, style_rects
+from collage.layouts import LAYOUTS, STYLE_COUNTS, compile_layout, layout_auto, layout_for_style
+from collage.pyramid import Pyramid
+from collage.renderer import Composition, compose_collage
+from collage.utils import probe_images
+
+SIZES = ['1080x1920', '2160x3840']
+
+def make_image(path, megapixels, seed=0):
+    # Gradient with shapes, so encoders and resamplers do realistic work
+    w = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    h = int(w * 3 / 4)
+    img = Image.linear_gradient('L').resize((w, h)).convert('RGB')
+    draw = ImageDraw.Draw(img)
+    for i in range(0, w, max(1, w // 12)):
+        y = (i * h // w + seed * 97) % h
+        draw.ellipse((i, y, i + w // 16, y + w // 16), fill=(200, 40 + seed * 30 % 200, 90))
+    if path.endswith('.jpg'):
+        img.save(path, quality=90)
+    else:
+        img.save(path)
+
+def image_paths(data, fmt, count=5):
+    return [os.path.join(data, f'source{i}.{fmt}') for i in range(count)]
+
+def make_data(data, megapixels, formats):
+    for fmt in formats:
+        for i, path in enumerate(image_paths(data, fmt)):
+            make_image(path, megapixels, i)
+
+def cases(formats):
+    """
+    Maps case names to setup functions. A setup function takes the data
+    directory and returns the zero-argument callable that is timed.
+    """
+    found = {}
+    for style in LAYOUTS:
+        def layout_case(data, style=style):
+            def run():
+                for _ in range(1000):
+                    compile_layout.cache_clear()
+                    compile_layout(style, (1080, 1920))
+            return run
+        found[f'layout.compile.{style}'] = layout_case
+    def auto_case(data):
+        aspects = [4 / 3, 3 / 4, 1, 16 / 9, 9 / 16] * 20
+        return lambda: layout_auto(aspects, (1080, 1920))
+    found['layout.auto.100'] = auto_case
+    def resample_case(data, pyramid):
+        # One decoded photo resampled to every tile size of two exports and
+        # a few previews, from full resolution or from a pyramid built on
+        # the fly
+        with Image.open(image_paths(data, formats[0])[0]) as img:
+            base = img.convert('RGB')
+        sizes = [(w, h) for size in SIZES for x, y, w, h in layout_for_style('5-2-3', tuple(map(int, size.split('x'))))]
+        sizes += [(270, 480), (135, 240), (68, 120)]
+        def run():
+            source = Pyramid(base) if pyramid else None
+            for size in sizes:
+                src = source.level_for(size) if pyramid else base
+                src.resize(size, Image.Resampling.LANCZOS)
+        return run
+    found['resample.full'] = lambda data: resample_case(data, False)
+    found['resample.pyramid'] = lambda data: resample_case(data, True)
+    def frame_case(data, style):
+        # Pasting resized tiles onto a poster-sized canvas, with or without
+        # gutters, borders and rounded corners
+        output_size = (4320, 7680)
+        frames = style_rects(layout_for_style('5-2-3', output_size), output_size, style)
+        tiles = [Image.new('RGB', photo_rect(frame, style)[2:], (40 * i, 90, 160)) for i, frame in enumerate(frames)]
+        def run():
+            canvas = Image.new('RGB', output_size, style.background)
+            for tile, frame in zip(tiles, frames):
+                canvas.paste(tile, photo_rect(frame, style)[:2])
+                paint_frame(canvas, frame, style)
+        return run
+    def swap_case(data, incremental):
+        # Re-exporting after swapping one photo, as the GUI does
+        output_size = (2160, 3840)
+        paths = image_paths(data, formats[0])
+        swapped = paths[:4] + paths[:1]
+        positions = layout_for_style('5-2-3', output_size)
+        composition = Composition()
+        composition.render(paths, positions, output_size)
+        def run():
+            for sources in (swapped, paths):
+                if incremental:
+                    composition.render(sources, positions, output_size)
+                else:
+                    compose_collage(sources, positions, output_size)
+        return run
+    found['swap.full'] = lambda data: swap_case(data, False)
+    found['swap.incremental'] = lambda data: swap_case(data, True)
+    found['frame.plain'] = lambda data: frame_case(data, TileStyle())
+    found['frame.styled'] = lambda data: frame_case(data, TileStyle(gutter=24, radius=64, border=8, border_color=(20, 20, 20), background=(240, 236, 228)))
+    for fmt in formats:
+        def validate_case(data, fmt=fmt):
+            paths = image_paths(data, fmt)
+            return lambda: probe_images(paths)
+        found[f'validate.{fmt}'] = validate_case
+        for style, count in STYLE_COUNTS.items():
+            for size in SIZES:
+                def render_case(data, style=style, count=count, size=size, fmt=fmt):
+                    output_size = tuple(map(int, size.split('x')))
+                    paths = image_paths(data, fmt)[:count]
+                    positions = layout_for_style(style, output_size)
+                    return lambda: compose_collage(paths, positions, output_size)
+                found[f'render.{style}.{size}.{fmt}'] = render_case
+        def cli_case(data, fmt=fmt):
+            out = os.path.join(data, 'cli-out.jpg')
+            cmd = [sys.executable, os.path.join(ROOT, 'main.py'), '5-2-3'] + image_paths(data, fmt) + ['-o', out, '--no-cache']
+            return lambda: subprocess.run(cmd, check=True, capture_output=True)
+        found[f'cli.5-2-3.{fmt}'] = cli_case
+    return found
+
+def peak_rss():
+    # ru_maxrss is KiB on Linux, bytes on macOS; CLI cases run in children
+    rss = max(resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+def cpu_time():
+    usage = [resource.getrusage(who) for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)]
+    return sum(u.ru_utime + u.ru_stime for u in usage)
+
+def run_case(name, data, repeat, formats):
+    run = cases(formats)[name](data)
+    walls, cpus = [], []
+    for _ in range(repeat):
+        cpu = cpu_time()
+        start = time.perf_counter()
+        run()
+        walls.append(time.perf_counter() - start)
+        cpus.append(cpu_time() - cpu)
+    print(json.dumps({'wall': statistics.median(walls), 'cpu': statistics.median(cpus), 'peak_rss': peak_rss(), 'runs': repeat}))
+
+def compare(baseline, current, threshold):
+    """
+    Returns (case, metric, base, new, change) for every metric of every
+    common case that grew by more than threshold (a fraction).
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if not base:
+            continue
+        for metric in ('wall', 'peak_rss'):
+            if base[metric] > 0:
+                change = result[metric] / base[metric] - 1
+                if change > threshold:
+                    regressions.append((name, metric, base[metric], result[metric], change))
+    return regressions
+
+def report(regressions, threshold):
+    if not regressions:
+        print(f'No regressions above {threshold:.0%}')
+        return 0
+    for name, metric, base, new, change in regressions:
+        print(f'REGRESSION {name} {metric}: {base:.4g} -> {new:.4g} (+{change:.0%})')
+    return 1
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the collage benchmark suite.')
+    parser.add_argument('-o', '--output', default='bench_results.json', help='Where to write the JSON results')
+    parser.add_argument('-k', '--filter', default='', help='Only run cases whose name contains this')
+    parser.add_argument('--megapixels', type=float, default=12, help='Size of the synthetic source images')
+    parser.add_argument('--formats', default='jpg,png', help='Comma-separated source formats')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per case (the median is kept)')
+    parser.add_argument('--baseline', help='Compare the new results against this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Relative growth flagged as a regression')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help='Only compare two result files')
+    parser.add_argument('--list', action='store_true', help='List case names and exit')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--make-data', help=argparse.SUPPRESS)
+    parser.add_argument('--data', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    formats = args.formats.split(',')
+
+    if args.make_data:
+        make_data(args.make_data, args.megapixels, formats)
+        return
+    if args.child:
+        run_case(args.child, args.data, args.repeat, formats)
+        return
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        sys.exit(report(compare(baseline, current, args.threshold), args.threshold))
+    names = [name for name in cases(formats) if args.filter in name]
+    if args.list:
+        print('\n'.join(names))
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as data:
+        # Generated in a child so this process's RSS high-water mark, which
+        # forked children inherit on Linux, stays small
+        subprocess.run([sys.executable, __file__, '--make-data', data, '--megapixels', str(args.megapixels), '--formats', args.formats], check=True)
+        for name in names:
+            cmd = [sys.executable, __file__, '--child', name, '--data', data, '--repeat', str(args.repeat), '--formats', args.formats]
+            results[name] = json.loads(subprocess.run(cmd, check=True, capture_output=True, text=True).stdout)
+            r = results[name]
+            print(f"{name:<40} wall {r['wall'] * 1000:9.2f} ms  cpu {r['cpu'] * 1000:9.2f} ms  peak RSS {r['peak_rss'] / 2**20:7.1f} MiB")
+    current = {
+        'meta': {
+            'python': platform.python_version(),
+            'pillow': Image.__version__,
+            'machine': platform.machine(),
+            'megapixels': args.megapixels,
+            'formats': formats,
+            'repeat': args.repeat,
+            'timestamp': time.time(),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(current, f, indent=2)
+    print(f'Results written to {args.output}')
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        sys.exit(report(compare(baseline, current, args.threshold), args.threshold))
+
+if __name__ == '__main__':
+    main()
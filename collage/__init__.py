@@ -1 +1,6 @@
 # Collage package init
+# encode stays in collage.api: as a package attribute it would shadow the
+# collage.encode module
+from collage.api import layout, probe, render, render_collage, render_collages
+from collage.compositor import TileStyle
+from collage.renderer import Composition
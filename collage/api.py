@@ -0,0 +1,69 @@
+"""
+Library entry points for embedding the renderer, e.g. in a web service.
+
+Inputs are file paths, encoded bytes, binary file objects or PIL images and
+the collage comes back encoded in memory, so nothing touches the disk. Each
+stage can also be called on its own:
+
+    infos = probe(sources)
+    positions = layout(style, output_size, infos)
+    img = render(sources, positions, output_size, infos=infos)
+    data, result = encode(img, 'JPEG', 'web')
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image
+from collage.cache import TileCache
+from collage.compositor import TileStyle
+from collage.encode import EncodeResult, encode
+from collage.layouts import STYLE_COUNTS, layout_for_style
+from collage.renderer import Source, compose_collage, compose_sizes, source_info
+from collage.utils import ImageInfo
+
+Rect = Tuple[int, int, int, int]
+
+def probe(sources: List[Source]) -> List[ImageInfo]:
+    """
+    Reads the header of every source, see collage.renderer.source_info.
+    """
+    return [source_info(source) for source in sources]
+
+def layout(style: str, output_size: Tuple[int, int], infos: List[ImageInfo]) -> List[Rect]:
+    """
+    Tile rects for a collage style, checking the number of photos.
+    """
+    count = STYLE_COUNTS.get(style)
+    if count and len(infos) != count:
+        raise ValueError(f'{style} needs {count} images, got {len(infos)}')
+    return layout_for_style(style, output_size, [info.aspect for info in infos])
+
+def render(sources: List[Source], positions: List[Rect], output_size: Tuple[int, int], infos: Optional[List[ImageInfo]] = None, fit: str = 'stretch', crop: str = 'center', workers: Optional[int] = None, cache: Optional[TileCache] = None, color: Optional[bytes] = None, tile_style: Optional[TileStyle] = None) -> Image.Image:
+    """
+    Composes the collage canvas, see collage.renderer.compose_collage.
+    Tiles are decoded on threads when workers > 1. color is the output ICC
+    profile, see collage.color.load_profile; tile_style adds gutters,
+    borders and rounded corners, see collage.compositor.
+    """
+    return compose_collage(sources, positions, output_size, workers=workers, cache=cache, infos=infos, fit=fit, crop=crop, color=color, tile_style=tile_style)
+
+def render_collage(sources: List[Source], style: str, output_size: Tuple[int, int], fmt: str = 'JPEG', preset: str = 'fast', target_size: Optional[int] = None, fit: str = 'stretch', crop: str = 'center', workers: Optional[int] = None, cache: Optional[TileCache] = None, color: Optional[bytes] = None, tile_style: Optional[TileStyle] = None) -> Tuple[bytes, EncodeResult]:
+    """
+    Lays out, renders and encodes a collage in one call and returns the
+    encoded bytes with the encoder's report. Raises ValueError for a wrong
+    number of photos and OSError for unreadable ones.
+    """
+    infos = probe(sources)
+    positions = layout(style, output_size, infos)
+    img = render(sources, positions, output_size, infos, fit, crop, workers, cache, color, tile_style)
+    return encode(img, fmt, preset, target_size)
+
+def render_collages(sources: List[Source], style: str, output_sizes: Sequence[Tuple[int, int]], formats: Sequence[str] = ('JPEG',), preset: str = 'fast', target_size: Optional[int] = None, fit: str = 'stretch', crop: str = 'center', workers: Optional[int] = None, cache: Optional[TileCache] = None, color: Optional[bytes] = None, tile_style: Optional[TileStyle] = None) -> Dict[Tuple[Tuple[int, int], str], Tuple[bytes, EncodeResult]]:
+    """
+    Renders one collage at several sizes and encodes each in every format,
+    decoding each source once (see collage.renderer.compose_sizes). Returns
+    {(output_size, format): (data, EncodeResult)}.
+    """
+    infos = probe(sources)
+    layouts = [(tuple(size), layout(style, size, infos)) for size in output_sizes]
+    images = compose_sizes(sources, layouts, workers=workers, cache=cache, infos=infos, fit=fit, crop=crop, color=color, tile_style=tile_style)
+    return {(size, fmt): encode(img, fmt, preset, target_size) for (size, _), img in zip(layouts, images) for fmt in formats}
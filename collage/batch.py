@@ -0,0 +1,190 @@
+import csv
+import json
+import math
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, BrokenExecutor, wait
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from collage.cache import TileCache
+from collage.encode import format_for_path, parse_file_size, save_image
+from collage.layouts import STYLE_COUNTS, layout_for_style
+from collage.renderer import EXECUTORS, compose_collage
+from collage.store import SourceStore
+from collage.utils import parse_size, probe_images
+
+class Job(NamedTuple):
+    index: int
+    style: str
+    images: List[str]
+    output_size: Tuple[int, int]
+    output: str
+    fit: str = 'stretch'
+    crop: str = 'center'
+    preset: str = 'fast'
+    target_size: Optional[int] = None
+    color: Optional[bytes] = None
+    error: Optional[str] = None  # why the manifest entry could not be read
+
+class JobResult(NamedTuple):
+    index: int
+    output: str
+    ok: bool
+    seconds: float
+    error: Optional[str] = None
+    nbytes: int = 0
+    encode_seconds: float = 0.0
+
+def read_manifest(path: str, default_size: Tuple[int, int], preset: str = 'fast', target_size: Optional[int] = None, color: Optional[bytes] = None) -> Iterator[Job]:
+    """
+    Yields jobs from a JSONL or CSV manifest.
+
+    Each entry has a style, a list of images, an optional size (WxH), an
+    output path and optionally fit and crop modes, an encoder preset and a
+    target size (e.g. 300K). In CSV manifests the images column is separated by '|'.
+    Relative paths are resolved against the manifest's directory. Every
+    job renders into the output ICC profile color, if given.
+
+    Entries that cannot be parsed still yield a job, carrying the line
+    number and the error, which render_job reports as a failure.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, newline='') as f:
+        if path.lower().endswith('.csv'):
+            reader = csv.DictReader(f)
+            lines = ((reader.line_num, row) for row in reader)
+        else:
+            lines = ((n, line) for n, line in enumerate(f, 1) if line.strip())
+        for index, (line_num, row) in enumerate(lines):
+            try:
+                if isinstance(row, str):
+                    row = json.loads(row)
+                yield _parse_row(index, row, base, default_size, preset, target_size, color)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                output = row.get('output') if isinstance(row, dict) else None
+                error = f'line {line_num}: {type(e).__name__}: {e}'
+                yield Job(index, '', [], default_size, os.path.join(base, output) if isinstance(output, str) else '', error=error)
+
+def _parse_row(index: int, row: dict, base: str, default_size: Tuple[int, int], preset: str, target_size: Optional[int], color: Optional[bytes]) -> Job:
+    images = row['images']
+    if isinstance(images, str):
+        images = [p.strip() for p in images.split('|') if p.strip()]
+    size = row.get('size')
+    target = row.get('target_size')
+    return Job(
+        index,
+        row['style'],
+        [os.path.join(base, p) for p in images],
+        parse_size(size) if size else default_size,
+        os.path.join(base, row['output']),
+        row.get('fit') or 'stretch',
+        row.get('crop') or 'center',
+        row.get('preset') or preset,
+        parse_file_size(str(target)) if target else target_size,
+        color,
+    )
+
+_worker_cache = None
+_worker_store = None
+
+def _init_worker(cache: Optional[TileCache], store: Optional[SourceStore] = None):
+    global _worker_cache, _worker_store
+    _worker_cache = cache
+    _worker_store = store
+
+def render_job(job: Job, cache: Optional[TileCache] = None, store: Optional[SourceStore] = None) -> JobResult:
+    """
+    Renders a single job, writing the output atomically so that an existing
+    output file always means a finished job. Without an explicit cache or
+    store the ones installed for the current pool worker are used.
+    """
+    if cache is None:
+        cache = _worker_cache
+    if store is None:
+        store = _worker_store
+    if job.error:
+        return JobResult(job.index, job.output, False, 0.0, job.error)
+    start = time.perf_counter()
+    tmp = f'{job.output}.{os.getpid()}.tmp'
+    try:
+        if len(job.images) != STYLE_COUNTS.get(job.style, len(job.images)):
+            raise ValueError(f'{job.style} needs {STYLE_COUNTS[job.style]} images, got {len(job.images)}')
+        infos = probe_images(job.images)
+        positions = layout_for_style(job.style, job.output_size, [info.aspect for info in infos])
+        collage = compose_collage(job.images, positions, job.output_size, cache=cache, infos=infos, fit=job.fit, crop=job.crop, store=store, color=job.color)
+        encoded = save_image(collage, tmp, format_for_path(job.output), job.preset, job.target_size)
+        os.replace(tmp, job.output)
+    except Exception as e:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return JobResult(job.index, job.output, False, time.perf_counter() - start, f'{type(e).__name__}: {e}')
+    return JobResult(job.index, job.output, True, time.perf_counter() - start, None, encoded.nbytes, encoded.seconds)
+
+def run_batch(jobs: Iterable[Job], workers: int = 1, executor: str = 'process', resume: bool = False, cache: Optional[TileCache] = None, store: Optional[SourceStore] = None) -> Iterator[JobResult]:
+    """
+    Renders jobs on a bounded worker pool and yields results as they finish.
+
+    At most two jobs per worker are in flight, so arbitrarily long manifests
+    are streamed rather than queued up front. With resume, jobs whose output
+    already exists are skipped. Failures are reported, never raised.
+    A tile cache is shared by thread workers; process workers each get their
+    own memory tier on top of the shared disk tier. A SourceStore serves
+    pre-decoded sources to every worker.
+    """
+    if resume:
+        jobs = (job for job in jobs if job.error or not os.path.exists(job.output))
+    if workers <= 1:
+        for job in jobs:
+            yield render_job(job, cache, store)
+        return
+    with EXECUTORS[executor](max_workers=workers, initializer=_init_worker, initargs=(cache, store)) as pool:
+        pending = {}
+        for job in jobs:
+            try:
+                pending[pool.submit(render_job, job)] = job
+            except BrokenExecutor as e:
+                yield _failed(job, e)
+                continue
+            if len(pending) >= workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield _collect(future, pending.pop(future))
+        for future, job in pending.items():
+            yield _collect(future, job)
+
+def _failed(job: Job, error: BaseException) -> JobResult:
+    return JobResult(job.index, job.output, False, 0.0, f'{type(error).__name__}: {error}')
+
+def _collect(future, job: Job) -> JobResult:
+    # render_job reports its own errors; a dead worker (e.g. killed for
+    # running out of memory) breaks the pool, which fails the job instead
+    try:
+        return future.result()
+    except BrokenExecutor as e:
+        return _failed(job, e)
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of values, 0.0 for an empty list.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(pct / 100 * len(ordered))) - 1]
+
+def summarize(results: List[JobResult], elapsed: float) -> dict:
+    """
+    Throughput and latency summary for a finished batch.
+    """
+    latencies = [r.seconds for r in results if r.ok]
+    return {
+        'jobs': len(results),
+        'ok': len(latencies),
+        'failed': len(results) - len(latencies),
+        'elapsed': elapsed,
+        'collages_per_sec': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'bytes': sum(r.nbytes for r in results),
+        'encode_seconds': sum(r.encode_seconds for r in results),
+    }
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+from PIL import Image
+
+def file_identity(path: str, content_hash: bool = False) -> Tuple:
+    """
+    Identifies a source file by path, mtime and size, or by a SHA-1 of its
+    contents when content_hash is set (robust to copies and touches).
+    """
+    if content_hash:
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return ('sha1', digest.hexdigest())
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+class TileCache:
+    """
+    Cache of resized RGB tiles with an in-memory LRU bounded by max_bytes and
+    an optional on-disk tier of raw RGB blobs in cache_dir. The disk tier
+    is best-effort (failed writes are ignored) and is never pruned.
+
+    Keys come from key() and combine the source identity, the target (w, h),
+    the resample filter and any decode options that change the pixels. The
+    cache is thread-safe, so one instance can back the CLI, batch and GUI.
+    """
+    def __init__(self, max_bytes: int = 256 * 2**20, cache_dir: Optional[str] = None, content_hash: bool = False):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.content_hash = content_hash
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def __getstate__(self):
+        # Only the configuration travels to worker processes; the memory
+        # tier starts empty there and the disk tier is shared.
+        return {'max_bytes': self.max_bytes, 'cache_dir': self.cache_dir, 'content_hash': self.content_hash}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def key(self, path: str, size: Tuple[int, int], resample: str = 'lanczos', variant: Hashable = (), identity: Optional[Tuple] = None) -> Tuple:
+        """
+        Cache key for a tile; identity may come from a prior header probe
+        (ImageInfo.identity) to skip the stat.
+        """
+        if identity is None or self.content_hash:
+            identity = file_identity(path, self.content_hash)
+        return (identity, tuple(size), resample, variant)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'entries': len(self._tiles),
+                'bytes': self.nbytes,
+            }
+
+    def get(self, key: Tuple) -> Optional[Image.Image]:
+        with self._lock:
+            img = self._tiles.get(key)
+            if img is not None:
+                self._tiles.move_to_end(key)
+                self.hits += 1
+                return img
+        img = self._read_disk(key)
+        with self._lock:
+            if img is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._remember(key, img)
+        return img
+
+    def put(self, key: Tuple, img: Image.Image):
+        self._remember(key, img)
+        self._write_disk(key, img)
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+            self.nbytes = 0
+
+    def _remember(self, key, img):
+        size = img.width * img.height * 3
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._tiles.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.width * old.height * 3
+            self._tiles[key] = img
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._tiles.popitem(last=False)
+                self.nbytes -= evicted.width * evicted.height * 3
+
+    def _blob_path(self, key):
+        name = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.cache_dir, name[:2], name + '.rgb')
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._blob_path(key), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        size = key[1]
+        if len(data) != size[0] * size[1] * 3:
+            return None
+        return Image.frombytes('RGB', size, data)
+
+    def _write_disk(self, key, img):
+        if not self.cache_dir:
+            return
+        path = self._blob_path(key)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        # Best effort: the tile is already in memory, so a read-only or
+        # full cache directory only costs the disk copy
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, 'wb') as f:
+                f.write(img.tobytes())
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
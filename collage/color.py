@@ -0,0 +1,67 @@
+import io
+from functools import lru_cache
+from typing import Optional
+
+from PIL import Image, ImageCms
+
+@lru_cache(maxsize=1)
+def srgb_profile() -> bytes:
+    return ImageCms.ImageCmsProfile(ImageCms.createProfile('sRGB')).tobytes()
+
+def load_profile(spec: str) -> bytes:
+    """
+    ICC profile bytes for 'srgb' or the path of an RGB .icc/.icm file.
+    Raises OSError for unreadable files and ValueError for other files.
+    """
+    if spec.lower() == 'srgb':
+        return srgb_profile()
+    with open(spec, 'rb') as f:
+        data = f.read()
+    # Fail early on files that are not profiles
+    try:
+        profile = ImageCms.ImageCmsProfile(io.BytesIO(data))
+    except ImageCms.PyCMSError as e:
+        raise ValueError(f'{spec} is not an ICC profile') from e
+    if profile.profile.xcolor_space.strip() != 'RGB':
+        raise ValueError(f'{spec} is not an RGB profile')
+    return data
+
+@lru_cache(maxsize=64)
+def transform_for(source: bytes, target: bytes) -> Optional[ImageCms.ImageCmsTransform]:
+    """
+    The RGB to RGB transform between two ICC profiles, built once per pair
+    and shared: a batch from one camera builds it a single time. None when
+    the profiles are identical. Built without LittleCMS's pixel cache, so
+    one transform can be applied from several threads at once.
+
+    Tiles are RGB by the time they are converted, so a source profile for
+    another color space (a GRAY profile on a grayscale photo, CMYK on a
+    print file) or one that cannot be read is taken as sRGB.
+    """
+    try:
+        profile = ImageCms.ImageCmsProfile(io.BytesIO(source))
+    except ImageCms.PyCMSError:
+        profile = None
+    if profile is None or profile.profile.xcolor_space.strip() != 'RGB':
+        source = srgb_profile()
+        profile = None
+    if source == target:
+        return None
+    return ImageCms.buildTransform(
+        profile or ImageCms.ImageCmsProfile(io.BytesIO(source)),
+        ImageCms.ImageCmsProfile(io.BytesIO(target)),
+        'RGB', 'RGB',
+        renderingIntent=ImageCms.Intent.PERCEPTUAL,
+        flags=ImageCms.Flags.NOCACHE,
+    )
+
+def to_profile(img: Image.Image, source: Optional[bytes], target: bytes) -> Image.Image:
+    """
+    Converts RGB pixels from profile source (None for untagged images,
+    taken as sRGB) into target, and tags the result with target.
+    """
+    transform = transform_for(source or srgb_profile(), target)
+    if transform is not None:
+        img = ImageCms.applyTransform(img, transform)
+    img.info['icc_profile'] = target
+    return img
@@ -0,0 +1,98 @@
+"""
+Tile styling: gutters, borders, rounded corners and the background color.
+
+Gutters are folded into the tile rects (see collage.layouts.inset_rects), so
+they cost nothing beyond filling the canvas with the background. Borders and
+corners only touch the tile's edges: the border is four strips around the
+photo, and each rounded corner is a radius x radius patch painted over the
+photo with a precomputed antialiased mask. No mask ever spans a whole tile,
+and masks are built once per (radius, border) with numpy.
+"""
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from collage.layouts import inset_rects
+
+Rect = Tuple[int, int, int, int]
+Color = Tuple[int, int, int]
+
+WHITE = (255, 255, 255)
+
+class TileStyle(NamedTuple):
+    gutter: int = 0  # pixels between neighbouring tiles
+    margin: Optional[int] = None  # pixels around the collage, gutter if None
+    radius: int = 0  # corner radius of every tile, border included
+    border: int = 0  # border width, drawn inside the tile rect
+    border_color: Color = WHITE
+    background: Color = WHITE
+
+    @property
+    def plain(self) -> bool:
+        """
+        True when tiles are plain rectangles that just need pasting.
+        """
+        return not self.radius and not self.border
+
+PLAIN = TileStyle()
+
+def style_rects(positions: List[Rect], output_size: Tuple[int, int], style: TileStyle) -> List[Rect]:
+    """
+    Tile rects with the style's gutters and margin opened up.
+    """
+    return inset_rects(positions, output_size, style.gutter, style.margin)
+
+def photo_rect(rect: Rect, style: TileStyle) -> Rect:
+    """
+    The part of a tile rect the photo fills, inside its border.
+    """
+    x, y, w, h = rect
+    b = min(style.border, (min(w, h) - 1) // 2)
+    return x + b, y + b, w - 2 * b, h - 2 * b
+
+@lru_cache(maxsize=256)
+def outside_mask(radius: int, arc: int, corner: int) -> Image.Image:
+    """
+    An 'L' mask of a radius x radius corner patch covering what lies outside
+    a circular arc of radius arc that ends flush with the patch's inner
+    edges, antialiased over one pixel. corner counts clockwise from the top
+    left (0) to the bottom left (3).
+    """
+    # Pixel centres, measured from the arc's centre at the patch's inner corner
+    d = np.arange(radius, dtype=np.float64)[::-1] + 0.5
+    dist = np.hypot(d[:, None], d[None, :])
+    alpha = np.clip(dist - arc + 0.5, 0.0, 1.0)
+    mask = Image.fromarray(np.round(alpha * 255).astype(np.uint8), 'L')
+    transpose = (None, Image.Transpose.FLIP_LEFT_RIGHT, Image.Transpose.ROTATE_180, Image.Transpose.FLIP_TOP_BOTTOM)[corner]
+    return mask.transpose(transpose) if transpose is not None else mask
+
+def paint_frame(canvas: Image.Image, rect: Rect, style: TileStyle, dy: int = 0):
+    """
+    Draws the border and rounds the corners of a tile whose photo has
+    already been pasted into photo_rect(rect, style). The canvas may be a
+    band of the collage starting at row dy; whatever falls outside it is
+    clipped.
+    """
+    if style.plain:
+        return
+    x, y, w, h = rect
+    y -= dy
+    px, py, pw, ph = photo_rect(rect, style)
+    py -= dy
+    if (pw, ph) != (w, h):
+        canvas.paste(style.border_color, (x, y, x + w, py))
+        canvas.paste(style.border_color, (x, py + ph, x + w, y + h))
+        canvas.paste(style.border_color, (x, py, px, py + ph))
+        canvas.paste(style.border_color, (px + pw, py, x + w, py + ph))
+    radius = min(style.radius, w // 2, h // 2)
+    if radius < 1:
+        return
+    inner = radius - (px - x)
+    corners = ((x, y), (x + w - radius, y), (x + w - radius, y + h - radius), (x, y + h - radius))
+    for corner, (cx, cy) in enumerate(corners):
+        box = (cx, cy, cx + radius, cy + radius)
+        if inner > 0 and px > x:
+            canvas.paste(style.border_color, box, outside_mask(radius, inner, corner))
+        canvas.paste(style.background, box, outside_mask(radius, radius, corner))
@@ -0,0 +1,100 @@
+import numpy as np
+from PIL import Image
+from typing import Tuple
+
+# Ways of fitting a photo into its tile
+FIT_MODES = ('stretch', 'cover', 'contain')
+# Ways of placing the crop window for fit='cover'
+CROP_MODES = ('center', 'entropy', 'saliency')
+
+# Longest side of the thumbnail the crop window is scored on
+THUMB_SIZE = 96
+
+def check_fit(fit: str):
+    """
+    Raises ValueError for a fit mode other than FIT_MODES.
+    """
+    if fit not in FIT_MODES:
+        raise ValueError(f'Unknown fit mode: {fit}')
+
+def cover_window(src_size: Tuple[int, int], target_size: Tuple[int, int]) -> Tuple[float, float]:
+    """
+    Size of the largest window of src_size with the aspect ratio of target_size.
+    """
+    sw, sh = src_size
+    w, h = target_size
+    if sw * h > sh * w:
+        return sh * w / h, sh
+    return sw, sw * h / w
+
+def contain_rect(src_size: Tuple[int, int], rect: Tuple[int, int, int, int]) -> Tuple[int, int, int, int]:
+    """
+    The part of rect (x, y, w, h) an image of src_size fills when scaled to fit
+    inside it, centered.
+    """
+    x, y, w, h = rect
+    sw, sh = src_size
+    if sw * h > sh * w:
+        ih = max(1, round(w * sh / sw))
+        return x, y + (h - ih) // 2, w, ih
+    iw = max(1, round(h * sw / sh))
+    return x + (w - iw) // 2, y, iw, h
+
+def _window_scores(energy: np.ndarray, length: int) -> np.ndarray:
+    # Sum of energy over every window of length along axis 0
+    csum = np.concatenate([np.zeros((1,) + energy.shape[1:]), np.cumsum(energy, axis=0)])
+    return csum[length:] - csum[:-length]
+
+def _saliency(gray: np.ndarray) -> np.ndarray:
+    # Gradient magnitude plus distance from the mean tone
+    gy, gx = np.gradient(gray)
+    return np.hypot(gx, gy) + np.abs(gray - gray.mean())
+
+def _entropy_scores(gray: np.ndarray, length: int) -> np.ndarray:
+    # Histogram entropy of every window along axis 0, using cumulative
+    # 16-bin histograms so all offsets are scored at once
+    bins = np.minimum(gray.astype(np.int64) // 16, 15)
+    counts = np.zeros((gray.shape[0], 16))
+    for b in range(16):
+        counts[:, b] = (bins == b).sum(axis=1)
+    hist = _window_scores(counts, length)
+    p = hist / np.maximum(hist.sum(axis=1, keepdims=True), 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return -np.nansum(np.where(p > 0, p * np.log2(p), 0.0), axis=1)
+
+def choose_crop(img: Image.Image, target_size: Tuple[int, int], mode: str = 'center') -> Tuple[float, float, float, float]:
+    """
+    Returns the (left, top, right, bottom) box of img to resample into
+    target_size for fit='cover'.
+
+    'center' keeps the middle of the image. 'entropy' and 'saliency' score
+    every window position on a small grayscale thumbnail, by histogram
+    entropy or by gradient energy and tonal contrast, and keep the best one.
+    The result only depends on the pixels, so it is deterministic.
+    """
+    if mode not in CROP_MODES:
+        raise ValueError(f'Unknown crop mode: {mode}')
+    sw, sh = img.size
+    cw, ch = cover_window(img.size, target_size)
+    horizontal = cw < sw
+    slack = (sw - cw) if horizontal else (sh - ch)
+    offset = slack / 2
+    if mode != 'center' and slack >= 1:
+        factor = max(1, max(sw, sh) // THUMB_SIZE)
+        thumb = img.reduce(factor) if factor > 1 else img
+        gray = np.asarray(thumb.convert('L'), dtype=np.float64)
+        if horizontal:
+            gray = gray.T
+        scale = (sw if horizontal else sh) / gray.shape[0]
+        length = max(1, min(gray.shape[0], round((cw if horizontal else ch) / scale)))
+        if mode == 'entropy':
+            scores = _entropy_scores(gray, length)
+        else:
+            scores = _window_scores(_saliency(gray).sum(axis=1), length)
+        # Ties resolve towards the center
+        positions = np.arange(len(scores))
+        best = np.lexsort((np.abs(positions - (len(scores) - 1) / 2), -np.round(scores, 9)))[0]
+        offset = min(slack, best * scale)
+    if horizontal:
+        return offset, 0, offset + cw, sh
+    return 0, offset, cw, offset + ch
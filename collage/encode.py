@@ -0,0 +1,135 @@
+import io
+import os
+import time
+from typing import BinaryIO, Dict, NamedTuple, Optional, Tuple, Union
+
+from PIL import Image
+from collage.profile import stage
+
+class Preset(NamedTuple):
+    quality: int  # JPEG, WebP and AVIF
+    subsampling: int  # JPEG chroma subsampling: 0 = 4:4:4, 2 = 4:2:0
+    progressive: bool  # JPEG
+    optimize: bool  # JPEG Huffman table optimization
+    webp_method: int  # 0 (fastest) to 6 (smallest)
+    avif_speed: int  # 0 (smallest) to 10 (fastest)
+    png_compress_level: int  # zlib level, 0 to 9
+
+# Named encoder settings. 'fast' matches Pillow's JPEG defaults and spends
+# as little time as possible in the encoder; 'web' trades some encode time
+# for smaller progressive files; 'archival' keeps full chroma and near
+# lossless quality.
+PRESETS: Dict[str, Preset] = {
+    'fast': Preset(75, 2, False, False, 0, 10, 1),
+    'web': Preset(80, 2, True, True, 4, 6, 6),
+    'archival': Preset(95, 0, False, True, 6, 4, 9),
+}
+
+# Formats where quality trades size for fidelity, i.e. where a target file
+# size can be met by searching the quality
+LOSSY_FORMATS = ('JPEG', 'WEBP', 'AVIF')
+
+# Formats that can embed an ICC profile
+ICC_FORMATS = ('JPEG', 'PNG', 'WEBP', 'AVIF', 'TIFF')
+
+class EncodeResult(NamedTuple):
+    format: str
+    quality: Optional[int]  # None for lossless formats
+    nbytes: int
+    seconds: float
+
+def format_for_path(path: str, default: str = 'JPEG') -> str:
+    """
+    The Pillow format name for a file name's extension.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    return Image.registered_extensions().get(ext, default)
+
+def save_options(fmt: str, preset: Union[str, Preset] = 'fast', quality: Optional[int] = None) -> dict:
+    """
+    Keyword arguments for Image.save in format fmt under a preset; quality
+    overrides the preset's.
+    """
+    p = PRESETS[preset] if isinstance(preset, str) else preset
+    q = p.quality if quality is None else quality
+    if fmt == 'JPEG':
+        return {'quality': q, 'subsampling': p.subsampling, 'progressive': p.progressive, 'optimize': p.optimize}
+    if fmt == 'WEBP':
+        return {'quality': q, 'method': p.webp_method}
+    if fmt == 'AVIF':
+        return {'quality': q, 'speed': p.avif_speed, 'subsampling': '4:4:4' if p.subsampling == 0 else '4:2:0'}
+    if fmt == 'PNG':
+        return {'compress_level': p.png_compress_level}
+    return {}
+
+def _encode_bytes(img: Image.Image, fmt: str, options: dict) -> bytes:
+    buf = io.BytesIO()
+    # Embed the collage's color profile, if it was rendered into one
+    if img.info.get('icc_profile') and fmt in ICC_FORMATS:
+        options = dict(options, icc_profile=img.info['icc_profile'])
+    img.save(buf, format=fmt, **options)
+    # Hands over BytesIO's buffer without copying it
+    return buf.getvalue()
+
+def encode(img: Image.Image, fmt: str, preset: Union[str, Preset] = 'fast', target_size: Optional[int] = None) -> Tuple[bytes, EncodeResult]:
+    """
+    Encodes img in format fmt and returns (data, EncodeResult).
+
+    With target_size (in bytes) the quality is binary searched, between 1
+    and the preset's quality, for the best quality whose output fits; if
+    none fits the smallest output is kept. Only lossy formats support a
+    target size, others raise ValueError. The reported time covers every
+    encode attempt.
+    """
+    with stage('encode') as s:
+        data, result = _encode(img, fmt, PRESETS[preset] if isinstance(preset, str) else preset, target_size)
+        s.count(bytes=result.nbytes)
+    return data, result
+
+def _encode(img: Image.Image, fmt: str, p: Preset, target_size: Optional[int]) -> Tuple[bytes, EncodeResult]:
+    start = time.perf_counter()
+    if target_size is None:
+        data = _encode_bytes(img, fmt, save_options(fmt, p))
+        quality = p.quality if fmt in LOSSY_FORMATS else None
+        return data, EncodeResult(fmt, quality, len(data), time.perf_counter() - start)
+    if fmt not in LOSSY_FORMATS:
+        raise ValueError(f'A target size needs a lossy format ({", ".join(LOSSY_FORMATS)}), not {fmt}')
+    best = None
+    lo, hi = 1, p.quality
+    while lo <= hi:
+        q = (lo + hi) // 2
+        data = _encode_bytes(img, fmt, save_options(fmt, p, q))
+        if len(data) <= target_size:
+            best = (data, q)
+            lo = q + 1
+        else:
+            hi = q - 1
+    if best is None:
+        best = (_encode_bytes(img, fmt, save_options(fmt, p, 1)), 1)
+    data, quality = best
+    return data, EncodeResult(fmt, quality, len(data), time.perf_counter() - start)
+
+def save_image(img: Image.Image, fp: Union[str, BinaryIO], fmt: Optional[str] = None, preset: Union[str, Preset] = 'fast', target_size: Optional[int] = None) -> EncodeResult:
+    """
+    Encodes img (see encode) and writes it to a path or binary file. The
+    format defaults to the one for the path's extension.
+    """
+    if fmt is None:
+        fmt = format_for_path(fp) if isinstance(fp, str) else 'JPEG'
+    data, result = encode(img, fmt, preset, target_size)
+    if isinstance(fp, str):
+        with open(fp, 'wb') as f:
+            f.write(data)
+    else:
+        fp.write(data)
+    return result
+
+def parse_file_size(value: str) -> int:
+    """
+    Parses a byte count such as '250000', '250K' or '1.5M' (powers of 1024).
+    """
+    value = value.strip().upper().rstrip('B')
+    units = {'K': 2**10, 'M': 2**20, 'G': 2**30}
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
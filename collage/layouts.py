@@ -1,62 +1,253 @@
-from typing import List, Tuple
+import math
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
 
-# Layout algorithms for 3, 4, 5 photo collages
+# Declarative layouts: a layout is a tree of splits. A split stacks its
+# children as rows (top to bottom) or columns (left to right), sharing the
+# space by weight; a None child is a photo tile.
+
+class Split(NamedTuple):
+    direction: str  # 'rows' or 'cols'
+    weights: Tuple[float, ...]
+    children: Tuple[Optional['Split'], ...]
+
+Layout = Union[str, Split]
+Rect = Tuple[int, int, int, int]
+
+def _split(direction: str, items) -> Split:
+    weights, children = [], []
+    for item in items:
+        if isinstance(item, Split):
+            weight, child = 1, item
+        elif isinstance(item, tuple):
+            weight, child = item
+        else:
+            weight, child = item, None
+        weights.append(weight)
+        children.append(child)
+    return Split(direction, tuple(weights), tuple(children))
+
+def rows(*items) -> Split:
+    """
+    Stacks items top to bottom. An item is a number (a tile with that
+    weight), a Split (weight 1) or a (weight, Split) pair.
+    """
+    return _split('rows', items)
+
+def cols(*items) -> Split:
+    """
+    Places items left to right, see rows.
+    """
+    return _split('cols', items)
+
+# Built-in collage styles
+LAYOUTS: Dict[str, Split] = {
+    '3-vertical': rows(1, 1, 1),
+    '4-vertical': rows(1, 1, 1, 1),
+    '4-grid': rows(cols(1, 1), cols(1, 1)),
+    '5-2-3': cols(rows(1, 1), rows(1, 1, 1)),
+    '5-3-2': cols(rows(1, 1, 1), rows(1, 1)),
+}
+
+def tile_count(layout: Layout) -> int:
+    layout = LAYOUTS[layout] if isinstance(layout, str) else layout
+    return sum(1 if child is None else tile_count(child) for child in layout.children)
+
+def _edges(start: int, length: int, weights: Tuple[float, ...]) -> List[int]:
+    # Rounded cumulative offsets, so extents always add up to length exactly
+    total = sum(weights)
+    edges, acc = [start], 0
+    for weight in weights:
+        acc += weight
+        edges.append(start + round(length * acc / total))
+    edges[-1] = start + length
+    return edges
+
+def _compile(node: Split, rect: Rect, out: List[Rect]):
+    x, y, w, h = rect
+    horizontal = node.direction == 'cols'
+    edges = _edges(x if horizontal else y, w if horizontal else h, node.weights)
+    for child, a, b in zip(node.children, edges, edges[1:]):
+        child_rect = (a, y, b - a, h) if horizontal else (x, a, w, b - a)
+        if child is None:
+            out.append(child_rect)
+        else:
+            _compile(child, child_rect, out)
+
+@lru_cache(maxsize=1024)
+def compile_layout(layout: Layout, output_size: Tuple[int, int]) -> Tuple[Rect, ...]:
+    """
+    Compiles a layout (a style name or a Split tree) into integer (x, y, w, h)
+    rects in tile order. Rects tile the canvas exactly, without gaps or
+    overlaps. Results are memoized per (layout, output_size).
+    """
+    node = LAYOUTS[layout] if isinstance(layout, str) else layout
+    out: List[Rect] = []
+    _compile(node, (0, 0) + tuple(output_size), out)
+    return tuple(out)
+
+def inset_rects(rects: List[Rect], output_size: Tuple[int, int], gutter: int, margin: Optional[int] = None) -> List[Rect]:
+    """
+    Opens gutters between tiles that tile the canvas: edges shared by two
+    tiles are pulled apart by gutter pixels in total, edges on the canvas
+    border by margin (gutter by default). Raises ValueError if a tile would
+    vanish.
+    """
+    margin = gutter if margin is None else margin
+    if not gutter and not margin:
+        return list(rects)
+    width, height = output_size
+    out = []
+    for x, y, w, h in rects:
+        left = margin if x == 0 else gutter // 2
+        top = margin if y == 0 else gutter // 2
+        right = margin if x + w == width else gutter - gutter // 2
+        bottom = margin if y + h == height else gutter - gutter // 2
+        if w - left - right < 1 or h - top - bottom < 1:
+            raise ValueError(f'Gutter {gutter} and margin {margin} leave no room for a {w}x{h} tile')
+        out.append((x + left, y + top, w - left - right, h - top - bottom))
+    return out
+
+class Divider(NamedTuple):
+    path: Tuple[int, ...]  # child indices leading to the split
+    index: int  # divider sits between children index and index + 1
+    direction: str  # direction of the split it belongs to
+    position: int  # x (for 'cols') or y (for 'rows') of the edge
+    rect: Rect  # extent of the split node
+
+def _dividers(node: Split, rect: Rect, path: Tuple[int, ...], out: List[Divider]):
+    x, y, w, h = rect
+    horizontal = node.direction == 'cols'
+    edges = _edges(x if horizontal else y, w if horizontal else h, node.weights)
+    for i, (child, a, b) in enumerate(zip(node.children, edges, edges[1:])):
+        if i:
+            out.append(Divider(path, i - 1, node.direction, a, rect))
+        if child is not None:
+            child_rect = (a, y, b - a, h) if horizontal else (x, a, w, b - a)
+            _dividers(child, child_rect, path + (i,), out)
+
+@lru_cache(maxsize=1024)
+def layout_dividers(layout: Layout, output_size: Tuple[int, int]) -> Tuple[Divider, ...]:
+    """
+    The draggable edges between siblings of a layout, in a stable order.
+    """
+    node = LAYOUTS[layout] if isinstance(layout, str) else layout
+    out: List[Divider] = []
+    _dividers(node, (0, 0) + tuple(output_size), (), out)
+    return tuple(out)
+
+def move_divider(layout: Layout, divider: Divider, delta: float, min_size: float = 1) -> Optional[Split]:
+    """
+    Returns a copy of layout with divider moved by delta output pixels, or
+    None if either neighbouring child would become smaller than min_size.
+    """
+    node = LAYOUTS[layout] if isinstance(layout, str) else layout
+    if not divider.path:
+        x, y, w, h = divider.rect
+        length = w if node.direction == 'cols' else h
+        weights = list(node.weights)
+        total = sum(weights)
+        a, b = weights[divider.index], weights[divider.index + 1]
+        shift = delta * total / length
+        if (a + shift) * length / total < min_size or (b - shift) * length / total < min_size:
+            return None
+        weights[divider.index] = a + shift
+        weights[divider.index + 1] = b - shift
+        return node._replace(weights=tuple(weights))
+    head = divider.path[0]
+    child = move_divider(node.children[head], divider._replace(path=divider.path[1:]), delta, min_size)
+    if child is None:
+        return None
+    children = list(node.children)
+    children[head] = child
+    return node._replace(children=tuple(children))
+
+def _partition(aspects: List[float], target: float) -> List[int]:
+    # Linear partition of aspects into consecutive rows whose aspect sums are
+    # as close as possible to target (squared log error). Rows longer than
+    # 2 * target are never worth it, which bounds the inner loop.
+    n = len(aspects)
+    prefix = [0.0]
+    for a in aspects:
+        prefix.append(prefix[-1] + a)
+    cost = [0.0] + [math.inf] * n
+    back = [0] * (n + 1)
+    limit = 2 * target
+    for end in range(1, n + 1):
+        best, best_start = math.inf, end - 1
+        start = end - 1
+        while start >= 0:
+            width = prefix[end] - prefix[start]
+            if width > limit and start < end - 1:
+                break
+            c = cost[start] + math.log(width / target) ** 2
+            if c < best:
+                best, best_start = c, start
+            start -= 1
+        cost[end], back[end] = best, best_start
+    breaks = [n]
+    while breaks[-1]:
+        breaks.append(back[breaks[-1]])
+    return breaks[::-1]
+
+def layout_auto(aspects: List[float], output_size: Tuple[int, int]) -> Split:
+    """
+    Justified rows for photos with the given aspect ratios (w / h), in order.
+
+    Each row is as tall as needed for its photos to fill the canvas width at
+    their own aspect ratio. Scaling the rows to the canvas height then
+    distorts every photo by the same factor, so the partition is chosen
+    (by linear-partition DP over a few target row widths) to make the rows'
+    natural heights add up to the canvas height as closely as possible.
+    """
+    width, height = output_size
+    total = sum(aspects)
+    ideal = math.sqrt(total * width / height)
+    best = None
+    for step in range(-3, 4):
+        target = ideal * 1.15 ** step
+        breaks = _partition(aspects, target)
+        row_sums = [sum(aspects[a:b]) for a, b in zip(breaks, breaks[1:])]
+        distortion = abs(math.log(width * sum(1 / s for s in row_sums) / height))
+        if best is None or distortion < best[0] - 1e-9:
+            best = (distortion, breaks, row_sums)
+    _, breaks, row_sums = best
+    return rows(*[(1 / s, cols(*aspects[a:b])) for s, a, b in zip(row_sums, breaks, breaks[1:])])
+
+# Number of photos each collage style takes; 'auto' takes any number
+STYLE_COUNTS = {name: tile_count(layout) for name, layout in LAYOUTS.items()}
+STYLES = list(LAYOUTS) + ['auto']
+
+def layout_for_style(style: str, output_size: Tuple[int, int], aspects: Optional[List[float]] = None) -> List[Rect]:
+    """
+    Returns the list of (x, y, w, h) for a named collage style. The 'auto'
+    style needs the photos' aspect ratios.
+    """
+    if style == 'auto':
+        if not aspects:
+            raise ValueError('The auto style needs the aspect ratio of every photo')
+        return list(compile_layout(layout_auto(list(aspects), tuple(output_size)), tuple(output_size)))
+    if style not in LAYOUTS:
+        raise ValueError(f'Unknown style: {style}')
+    return list(compile_layout(style, tuple(output_size)))
+
+# Named helpers for the built-in styles
 
 def layout_three_vertical(sizes: List[Tuple[int, int]], output_size: Tuple[int, int]):
     """
     Arrange 3 images vertically, sizes can be adjusted.
     Returns a list of (x, y, w, h) for each image.
     """
-    width, height = output_size
-    heights = [int(height * s[1] / sum([sz[1] for sz in sizes])) for s in sizes]
-    positions = []
-    y = 0
-    for i, h in enumerate(heights):
-        positions.append((0, y, width, h))
-        y += h
-    return positions
+    return list(compile_layout(rows(*[s[1] for s in sizes]), tuple(output_size)))
 
 def layout_four_vertical(output_size: Tuple[int, int]):
-    width, height = output_size
-    h = height // 4
-    return [(0, i*h, width, h) for i in range(4)]
+    return layout_for_style('4-vertical', output_size)
 
 def layout_four_grid(output_size: Tuple[int, int]):
-    width, height = output_size
-    w = width // 2
-    h = height // 2
-    return [(0, 0, w, h), (w, 0, w, h), (0, h, w, h), (w, h, w, h)]
+    return layout_for_style('4-grid', output_size)
 
 def layout_five_two_three(output_size: Tuple[int, int]):
-    width, height = output_size
-    w = width // 2
-    h = height
-    # Left column: 2 photos
-    h_left = h // 2
-    # Right column: 3 photos
-    h_right = h // 3
-    positions = [
-        (0, 0, w, h_left),
-        (0, h_left, w, h_left),
-        (w, 0, w, h_right),
-        (w, h_right, w, h_right),
-        (w, 2*h_right, w, h_right)
-    ]
-    return positions
+    return layout_for_style('5-2-3', output_size)
 
 def layout_five_three_two(output_size: Tuple[int, int]):
-    width, height = output_size
-    w = width // 2
-    h = height
-    # Left column: 3 photos
-    h_left = h // 3
-    # Right column: 2 photos
-    h_right = h // 2
-    positions = [
-        (0, 0, w, h_left),
-        (0, h_left, w, h_left),
-        (0, 2*h_left, w, h_left),
-        (w, 0, w, h_right),
-        (w, h_right, w, h_right)
-    ]
-    return positions
+    return layout_for_style('5-3-2', output_size)
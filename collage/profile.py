@@ -0,0 +1,165 @@
+"""
+Instrumentation for renders: per-stage timers and counters.
+
+Code under measurement wraps each stage in a timer:
+
+    with stage('decode') as s:
+        img = ...
+        s.count(pixels=img.width * img.height)
+
+and every finished stage is passed to the installed hooks as
+hook(name, seconds, counters). Without hooks stage() returns a shared
+no-op, so instrumented code costs a function call per stage. Hooks run on
+whichever thread ran the stage; stages inside process-pool workers are not
+reported.
+
+Stages: validate, layout, decode, reduce (of already decoded images),
+resize, color, paste, encode.
+"""
+import cProfile
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, TextIO
+
+Hook = Callable[[str, float, Dict[str, float]], None]
+
+_hooks: List[Hook] = []
+
+class _Stage:
+    __slots__ = ('name', 'counters', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.counters: Dict[str, float] = {}
+
+    def count(self, **counters: float):
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        for hook in list(_hooks):
+            hook(self.name, seconds, self.counters)
+        return False
+
+class _NoStage:
+    __slots__ = ()
+
+    def count(self, **counters: float):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NO_STAGE = _NoStage()
+
+def stage(name: str):
+    """
+    A context manager timing one stage; see the module docstring.
+    """
+    return _Stage(name) if _hooks else _NO_STAGE
+
+def enabled() -> bool:
+    return bool(_hooks)
+
+def add_hook(hook: Hook):
+    _hooks.append(hook)
+
+def remove_hook(hook: Hook):
+    _hooks.remove(hook)
+
+@contextmanager
+def hooked(*hooks: Hook):
+    """
+    Installs hooks for the duration of a with block.
+    """
+    for hook in hooks:
+        add_hook(hook)
+    try:
+        yield
+    finally:
+        for hook in hooks:
+            remove_hook(hook)
+
+class Breakdown:
+    """
+    A hook summing time and counters per stage, thread-safe.
+    """
+    def __init__(self):
+        self.stages: Dict[str, dict] = {}
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, name: str, seconds: float, counters: Dict[str, float]):
+        with self._lock:
+            totals = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0})
+            totals['calls'] += 1
+            totals['seconds'] += seconds
+            for key, value in counters.items():
+                totals[key] = totals.get(key, 0) + value
+
+    def report(self) -> str:
+        """
+        One line per stage in order of first use, with the wall time since
+        the breakdown started. Stages on worker threads overlap, so their
+        times may add up to more than the wall time.
+        """
+        wall = time.perf_counter() - self.start
+        lines = [f"{'stage':<10} {'calls':>6} {'total ms':>10} {'mean ms':>9}  counters"]
+        with self._lock:
+            for name, totals in self.stages.items():
+                extra = ', '.join(f'{key} {_human(key, value)}' for key, value in totals.items() if key not in ('calls', 'seconds'))
+                lines.append(f"{name:<10} {totals['calls']:>6} {totals['seconds'] * 1000:>10.1f} {totals['seconds'] * 1000 / totals['calls']:>9.2f}  {extra}")
+        lines.append(f'wall {wall * 1000:.1f} ms')
+        return '\n'.join(lines)
+
+def _human(key: str, value: float) -> str:
+    if key == 'pixels':
+        return f'{value / 1e6:.2f} MP'
+    if key == 'bytes':
+        return f'{value / 1024:.1f} KiB'
+    return f'{value:g}'
+
+def json_lines(stream: TextIO) -> Hook:
+    """
+    A hook writing each stage as a JSON line: {"stage", "ms", counters...}.
+    """
+    lock = threading.Lock()
+    def hook(name: str, seconds: float, counters: Dict[str, float]):
+        line = json.dumps({'stage': name, 'ms': round(seconds * 1000, 3), **counters})
+        with lock:
+            stream.write(line + '\n')
+    return hook
+
+@contextmanager
+def capture(cprofile_path: Optional[str] = None, trace_memory: bool = False):
+    """
+    Optionally runs a with block under cProfile (stats dumped to
+    cprofile_path, readable with pstats) and/or tracemalloc. Yields a dict
+    that receives 'peak_bytes' once the block ends when tracing memory.
+    """
+    result = {}
+    profiler = cProfile.Profile() if cprofile_path else None
+    if trace_memory:
+        tracemalloc.start()
+    if profiler:
+        profiler.enable()
+    try:
+        yield result
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(cprofile_path)
+        if trace_memory:
+            result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
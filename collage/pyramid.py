@@ -0,0 +1,37 @@
+import threading
+from typing import List, Tuple
+
+from PIL import Image
+
+class Pyramid:
+    """
+    Power-of-two reductions of one decoded image, for resampling it to many
+    sizes: each size resamples from the smallest level still at least as
+    large, so LANCZOS runs on roughly target-sized input instead of the full
+    image. Levels are built on first use, each by reduce(2) of the one
+    above, and kept. Thread-safe.
+    """
+    def __init__(self, base: Image.Image):
+        self.levels: List[Image.Image] = [base]
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.levels[0].size
+
+    def level_for(self, min_size: Tuple[int, int]) -> Image.Image:
+        """
+        The smallest level with both sides at least min_size (w, h), or the
+        full-size image if even that is smaller.
+        """
+        w, h = min_size
+        with self._lock:
+            i = 0
+            while True:
+                img = self.levels[i]
+                # reduce(2) rounds up, so the next level is (w + 1) // 2 wide
+                if (img.width + 1) // 2 < w or (img.height + 1) // 2 < h or min(img.size) < 2:
+                    return img
+                if i + 1 == len(self.levels):
+                    self.levels.append(img.reduce(2))
+                i += 1
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from typing import Optional, Sequence
+
+import numpy
+import PIL
+
+from collage.cache import file_identity
+from collage.utils import ImageInfo
+
+# Bump when the renderer's output changes for the same inputs
+RENDER_VERSION = 1
+
+class RenderCache:
+    """
+    Finished collage files on disk, keyed by a hash of everything that
+    decides their bytes: sources, layout rects, output size, render and
+    encoder options, and library versions. A hit copies the stored file to
+    the output path, so nothing is decoded or encoded.
+
+    Entries are plain files named by key. Hits touch an entry's mtime and
+    the least recently used entries are removed once the cache grows past
+    max_bytes. With link, hits hard-link the entry instead of copying it
+    (copying across file systems): outputs then share the entry's read-only
+    inode and must be replaced rather than rewritten in place.
+    """
+    def __init__(self, root: str, max_bytes: int = 1024 * 2**20, content_hash: bool = False, link: bool = False):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.content_hash = content_hash
+        self.link = link
+        self._lock = threading.Lock()
+
+    def key(self, sources: Sequence[str], infos: Optional[Sequence[ImageInfo]] = None, **spec) -> str:
+        """
+        The key of a render of source paths with the given options (rects,
+        output size, format, preset, ...; any JSON-serializable values).
+        infos from a prior probe supply mtime/size identities without a
+        stat; with content_hash the files are hashed instead.
+        """
+        if infos is not None and not self.content_hash:
+            identities = [info.identity for info in infos]
+        else:
+            identities = [file_identity(path, self.content_hash) for path in sources]
+        canonical = {
+            'version': [RENDER_VERSION, PIL.__version__, numpy.__version__],
+            'sources': identities,
+            **spec,
+        }
+        data = json.dumps(canonical, sort_keys=True, separators=(',', ':'), default=_encode_bytes)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key: str, dest: str) -> bool:
+        """
+        Places the stored render of key at dest and returns True, or False
+        on a miss.
+        """
+        entry = self._entry_path(key)
+        tmp = f'{dest}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.utime(entry)
+            if self.link:
+                try:
+                    os.link(entry, tmp)
+                except OSError:
+                    shutil.copyfile(entry, tmp)
+            else:
+                shutil.copyfile(entry, tmp)
+            os.replace(tmp, dest)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+        return True
+
+    def put(self, key: str, path: str):
+        """
+        Stores a copy of the finished file at path under key, then evicts
+        old entries down to max_bytes.
+        """
+        entry = self._entry_path(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        tmp = f'{entry}.{os.getpid()}.{threading.get_ident()}.tmp'
+        shutil.copyfile(path, tmp)
+        # Read-only, so a linked output is not edited in place by accident
+        os.chmod(tmp, 0o444)
+        os.replace(tmp, entry)
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits in
+        max_bytes.
+        """
+        with self._lock:
+            entries = []
+            for sub in os.scandir(self.root):
+                if not sub.is_dir():
+                    continue
+                for f in os.scandir(sub.path):
+                    if f.name.endswith('.tmp'):
+                        continue
+                    try:
+                        st = f.stat()
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime_ns, st.st_size, f.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+
+def _encode_bytes(value):
+    # ICC profiles and other bytes in specs are keyed by digest
+    if isinstance(value, bytes):
+        return hashlib.sha1(value).hexdigest()
+    raise TypeError(f'Cannot key a {type(value).__name__}')
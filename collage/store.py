@@ -0,0 +1,140 @@
+import hashlib
+import json
+import mmap
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image, ImageOps
+
+INDEX_NAME = 'index.json'
+PROFILE_NAME = 'profile.icc'
+
+class SourceStore:
+    """
+    Pre-decoded source images, kept as raw files at one or more reduction
+    levels (1 = full size, 2 = half, ...) with a JSON index.
+
+    Lookups memory-map the smallest stored level that still covers the
+    requested size and wrap it with Image.frombuffer, so pixels are paged in
+    straight from the file without decoding or copying. Pixels are stored
+    as RGBX, Pillow's in-memory layout for RGB, since frombuffer can only
+    map buffers in that layout and would copy packed RGB. Entries are keyed
+    by absolute path and only served while the file's mtime and size match.
+    A photo's embedded ICC profile is kept beside its levels and attached
+    to the images opened from them.
+    """
+    def __init__(self, root: str):
+        self.root = root
+        self._index: Optional[Dict[str, dict]] = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Worker processes reload the index themselves
+        return {'root': self.root}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @property
+    def index(self) -> Dict[str, dict]:
+        with self._lock:
+            if self._index is None:
+                try:
+                    with open(os.path.join(self.root, INDEX_NAME)) as f:
+                        self._index = json.load(f)
+                except (OSError, ValueError):
+                    self._index = {}
+            return self._index
+
+    def _entry_dir(self, path: str) -> str:
+        return os.path.join(self.root, hashlib.sha1(path.encode()).hexdigest())
+
+    def ingest(self, path: str, levels: Sequence[int] = (1, 2, 4)) -> List[Tuple[int, int]]:
+        """
+        Decodes path once, upright, and stores it at every reduction level.
+        Returns the stored sizes; call save_index() afterwards to publish
+        them.
+        """
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        entry_dir = self._entry_dir(path)
+        os.makedirs(entry_dir, exist_ok=True)
+        stored = []
+        with Image.open(path) as img:
+            full = ImageOps.exif_transpose(img).convert('RGB')
+        profile = full.info.get('icc_profile')
+        if profile:
+            with open(os.path.join(entry_dir, PROFILE_NAME), 'wb') as f:
+                f.write(profile)
+        for level in sorted(set(levels)):
+            img = full.reduce(level) if level > 1 else full
+            name = f'{img.width}x{img.height}.rgbx'
+            tmp = os.path.join(entry_dir, f'{name}.{os.getpid()}.tmp')
+            with open(tmp, 'wb') as f:
+                f.write(img.convert('RGBX').tobytes())
+            os.replace(tmp, os.path.join(entry_dir, name))
+            stored.append(img.size)
+        entry = {'mtime_ns': st.st_mtime_ns, 'file_size': st.st_size, 'size': list(full.size), 'levels': [list(size) for size in stored], 'icc': bool(profile)}
+        index = self.index
+        with self._lock:
+            index[path] = entry
+        return stored
+
+    def save_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, INDEX_NAME)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with self._lock:
+            data = json.dumps(self._index or {})
+        with open(tmp, 'w') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def lookup(self, path: str) -> Optional[dict]:
+        """
+        The index entry for path if it is stored and unchanged, else None.
+        """
+        path = os.path.abspath(path)
+        entry = self.index.get(path)
+        if entry is None:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if (st.st_mtime_ns, st.st_size) != (entry['mtime_ns'], entry['file_size']):
+            return None
+        return entry
+
+    def open(self, path: str, min_size: Tuple[int, int], entry: Optional[dict] = None) -> Optional[Image.Image]:
+        """
+        A read-only RGBX image of path backed by the smallest memory-mapped
+        level of at least min_size (w, h). None if the store has no current
+        copy of path or no level that large. entry may come from lookup().
+        """
+        entry = entry or self.lookup(path)
+        if entry is None:
+            return None
+        w, h = min_size
+        size = next((s for s in sorted(entry['levels']) if s[0] >= w and s[1] >= h), None)
+        if size is None:
+            return None
+        blob = os.path.join(self._entry_dir(os.path.abspath(path)), f'{size[0]}x{size[1]}.rgbx')
+        try:
+            with open(blob, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        if len(mapped) != size[0] * size[1] * 4:
+            mapped.close()
+            return None
+        # The image keeps the mapping alive; it is unmapped with the image
+        img = Image.frombuffer('RGBX', tuple(size), mapped, 'raw', 'RGBX', 0, 1)
+        if entry.get('icc'):
+            try:
+                with open(os.path.join(os.path.dirname(blob), PROFILE_NAME), 'rb') as f:
+                    img.info['icc_profile'] = f.read()
+            except OSError:
+                return None
+        return img
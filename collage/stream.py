@@ -0,0 +1,143 @@
+import os
+import struct
+import zlib
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+from PIL import Image, ImageChops
+from collage.color import to_profile
+from collage.compositor import PLAIN, TileStyle, paint_frame, photo_rect, style_rects
+from collage.crop import check_fit
+from collage.renderer import RESAMPLE_CHUNK, crop_box, fit_positions, load_source, resample_chunk, source_info
+
+class _TileRows:
+    """
+    Serves consecutive row ranges of one resized tile, decoding the source on
+    first use and keeping only the current resample chunk around.
+    """
+    def __init__(self, img_path: str, size: Tuple[int, int], draft: bool, fit: str, crop: str, color: Optional[bytes] = None):
+        self.img_path = img_path
+        self.size = size
+        self.draft = draft
+        self.fit = fit
+        self.crop = crop
+        self.color = color
+        self.src = None
+        self.box = None
+        self.chunk = None
+        self.chunk_top = None
+
+    def rows(self, top: int, bottom: int) -> Image.Image:
+        if self.src is None:
+            self.src = load_source(self.img_path, self.size, self.draft, self.fit)
+            self.box = crop_box(self.src, self.size, self.fit, self.crop)
+        w = self.size[0]
+        out = None
+        for c0 in range(top - top % RESAMPLE_CHUNK, bottom, RESAMPLE_CHUNK):
+            if self.chunk_top != c0:
+                self.chunk = resample_chunk(self.src, self.size, c0, self.box)
+                if self.color is not None:
+                    self.chunk = to_profile(self.chunk, self.src.info.get('icc_profile'), self.color)
+                self.chunk_top = c0
+            r0, r1 = max(c0, top), min(c0 + RESAMPLE_CHUNK, bottom)
+            piece = self.chunk.crop((0, r0 - c0, w, r1 - c0))
+            if out is None and r1 == bottom:
+                return piece
+            if out is None:
+                out = Image.new('RGB', (w, bottom - top))
+            out.paste(piece, (0, r0 - top))
+        return out
+
+def render_bands(image_paths: List[str], positions: List[Tuple[int, int, int, int]], output_size: Tuple[int, int], band_height: int = 256, draft: bool = True, fit: str = 'stretch', crop: str = 'center', color: Optional[bytes] = None, tile_style: Optional[TileStyle] = None) -> Iterator[Image.Image]:
+    """
+    Yields the collage as horizontal RGB bands of band_height rows, top to
+    bottom, pixel-identical to compose_collage.
+
+    Sources are decoded when the first band reaches their tile and released
+    after its last row, so peak memory is one band plus the decoded sources
+    and resample chunks of the tiles crossing it, never the whole canvas.
+    With color, chunks are converted into that ICC profile as they are
+    resampled, see load_tile. tile_style is applied as in compose_collage.
+    """
+    check_fit(fit)
+    width, height = output_size
+    tile_style = tile_style or PLAIN
+    frames = style_rects(positions, output_size, tile_style)
+    if fit == 'contain':
+        frames = fit_positions(frames, [source_info(p) for p in image_paths], fit)
+    positions = [photo_rect(frame, tile_style) for frame in frames]
+    tiles = [_TileRows(p, (w, h), draft, fit, crop, color) for p, (x, y, w, h) in zip(image_paths, positions)]
+    for top in range(0, height, band_height):
+        bottom = min(top + band_height, height)
+        band = Image.new('RGB', (width, bottom - top), tile_style.background)
+        for i, (x, y, w, h) in enumerate(positions):
+            tile = tiles[i]
+            if tile is None or y >= bottom or y + h <= top:
+                continue
+            r0, r1 = max(top, y) - y, min(bottom, y + h) - y
+            band.paste(tile.rows(r0, r1), (x, y + r0 - top))
+            if y + h <= bottom:
+                tiles[i] = None
+        if not tile_style.plain:
+            for x, y, w, h in frames:
+                if y < bottom and y + h > top:
+                    paint_frame(band, (x, y, w, h), tile_style, top)
+        yield band
+
+def _png_chunk(fp: BinaryIO, kind: bytes, data: bytes):
+    fp.write(struct.pack('>I', len(data)))
+    fp.write(kind)
+    fp.write(data)
+    fp.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind))))
+
+def write_png(fp: BinaryIO, size: Tuple[int, int], bands: Iterator[Image.Image], compress_level: int = 6, icc_profile: Optional[bytes] = None):
+    """
+    Writes RGB bands as one 8-bit PNG, compressing each band as it arrives.
+    Rows use the Sub filter, computed per band with ImageChops. icc_profile
+    is embedded as an iCCP chunk.
+    """
+    width, height = size
+    fp.write(b'\x89PNG\r\n\x1a\n')
+    _png_chunk(fp, b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+    if icc_profile:
+        _png_chunk(fp, b'iCCP', b'ICC Profile\0\0' + zlib.compress(icc_profile))
+    compressor = zlib.compressobj(compress_level)
+    stride = width * 3
+    for band in bands:
+        # Sub filter: each byte minus the same channel of the pixel to its left
+        shifted = ImageChops.offset(band, 1, 0)
+        shifted.paste((0, 0, 0), (0, 0, 1, band.height))
+        data = ImageChops.subtract_modulo(band, shifted).tobytes()
+        rows = b''.join(b'\x01' + data[i:i + stride] for i in range(0, len(data), stride))
+        compressed = compressor.compress(rows)
+        if compressed:
+            _png_chunk(fp, b'IDAT', compressed)
+    _png_chunk(fp, b'IDAT', compressor.flush())
+    _png_chunk(fp, b'IEND', b'')
+
+def write_ppm(fp: BinaryIO, size: Tuple[int, int], bands: Iterator[Image.Image]):
+    """
+    Writes RGB bands as a binary PPM (P6).
+    """
+    fp.write(b'P6\n%d %d\n255\n' % size)
+    for band in bands:
+        fp.write(band.tobytes())
+
+STREAM_WRITERS = {'.png': write_png, '.ppm': write_ppm}
+
+def save_collage_streaming(output_path: str, image_paths: List[str], positions: List[Tuple[int, int, int, int]], output_size: Tuple[int, int], band_height: int = 256, draft: bool = True, fmt: Optional[str] = None, fit: str = 'stretch', crop: str = 'center', compress_level: int = 6, color: Optional[bytes] = None, tile_style: Optional[TileStyle] = None):
+    """
+    Renders and writes a collage band by band. Only PNG and PPM can be
+    written incrementally; other formats raise ValueError. compress_level
+    applies to PNG, which also embeds color, the output ICC profile.
+    """
+    ext = '.' + fmt.lower() if fmt else os.path.splitext(output_path)[1].lower()
+    if ext not in STREAM_WRITERS:
+        raise ValueError(f'Streaming output supports {", ".join(STREAM_WRITERS)}, not {ext or output_path}')
+    # render_bands is lazy; fail before creating the file
+    check_fit(fit)
+    bands = render_bands(image_paths, positions, output_size, band_height, draft, fit, crop, color, tile_style)
+    with open(output_path, 'wb') as fp:
+        if ext == '.png':
+            write_png(fp, output_size, bands, compress_level, color)
+        else:
+            STREAM_WRITERS[ext](fp, output_size, bands)
@@ -1,15 +1,93 @@
-from PIL import Image
-from typing import List
+from PIL import Image, ImageColor
+from typing import List, NamedTuple, Optional, Tuple
 import os
 
+EXIF_ORIENTATION = 0x0112
+
+# How to turn pixels stored with each EXIF orientation upright; 5 to 8
+# swap width and height
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+SWAPPED_ORIENTATIONS = (5, 6, 7, 8)
+
+class ImageInfo(NamedTuple):
+    path: Optional[str]  # None for in-memory sources (bytes, file objects, images)
+    width: int
+    height: int
+    mode: str
+    format: Optional[str]
+    orientation: int
+    file_size: int
+    mtime_ns: int
+
+    @property
+    def display_size(self) -> Tuple[int, int]:
+        """(w, h) once the EXIF orientation is applied."""
+        if self.orientation in SWAPPED_ORIENTATIONS:
+            return self.height, self.width
+        return self.width, self.height
+
+    @property
+    def aspect(self) -> float:
+        """Displayed width / height, as layouts need it."""
+        w, h = self.display_size
+        return w / h
+
+    @property
+    def identity(self) -> Tuple:
+        """
+        Source identity as used by collage.cache.file_identity. In-memory
+        sources get (None, 0, 0), which does not tell them apart.
+        """
+        return (os.path.abspath(self.path) if self.path is not None else None, self.mtime_ns, self.file_size)
+
+def probe_image(path: str) -> ImageInfo:
+    """
+    Reads an image's header without decoding any pixels. The file is closed
+    before returning. Raises OSError if the file is missing or not an image.
+    """
+    st = os.stat(path)
+    with Image.open(path) as img:
+        orientation = img.getexif().get(EXIF_ORIENTATION, 1)
+        return ImageInfo(path, img.width, img.height, img.mode, img.format, orientation, st.st_size, st.st_mtime_ns)
+
+def probe_images(image_paths: List[str]) -> List[ImageInfo]:
+    return [probe_image(path) for path in image_paths]
+
 def validate_images(image_paths: List[str], min_count: int, max_count: int) -> bool:
     if not (min_count <= len(image_paths) <= max_count):
         return False
-    for path in image_paths:
-        if not os.path.isfile(path):
-            return False
-        try:
-            Image.open(path)
-        except Exception:
-            return False
+    try:
+        probe_images(image_paths)
+    except Exception:
+        return False
     return True
+
+def parse_size(value) -> Tuple[int, int]:
+    """
+    Parses an output size given as 'WxH' or a (w, h) pair.
+    """
+    if isinstance(value, str):
+        w, h = map(int, value.lower().split('x'))
+    else:
+        w, h = map(int, value)
+    if w <= 0 or h <= 0:
+        raise ValueError(f'Invalid size: {value}')
+    return w, h
+
+def parse_color(value) -> Tuple[int, int, int]:
+    """
+    Parses a color given as a name or '#rrggbb' (anything ImageColor
+    accepts), or an (r, g, b) triple. Alpha is dropped.
+    """
+    if isinstance(value, str):
+        return ImageColor.getrgb(value)[:3]
+    r, g, b = map(int, value[:3])
+    return r, g, b
@@ -1,2 +1,11 @@
+import os
+
 # Default configuration for collage output
 DEFAULT_OUTPUT_SIZE = (1080, 1920)  # Vertical, suitable for social media
+# Directory of pre-decoded source images (see collage.store), or None
+SOURCE_STORE = None
+# Output ICC profile ('srgb' or an .icc path) photos are converted into, or None to leave colors as they are
+COLOR_PROFILE = None
+# Directory of finished collages reused for identical renders (see collage.render_cache), or None
+RENDER_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'collage-app', 'renders')
+RENDER_CACHE_MB = 1024
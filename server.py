@@ -0,0 +1,4 @@
+from ui.server import main
+
+if __name__ == '__main__':
+    main()
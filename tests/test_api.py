@@ -0,0 +1,47 @@
+import unittest
+from collage import render_collage, render_collages
+from collage.cache import TileCache
+import io
+from PIL import Image
+
+def encoded(color, fmt='PNG'):
+    buf = io.BytesIO()
+    Image.new('RGB', (60, 40), color).save(buf, fmt)
+    return buf.getvalue()
+
+class TestApi(unittest.TestCase):
+    def test_render_collage_from_memory(self):
+        sources = [
+            encoded((255, 0, 0)),
+            io.BytesIO(encoded((0, 255, 0), 'JPEG')),
+            Image.new('RGB', (40, 60), (0, 0, 255)),
+        ]
+        data, result = render_collage(sources, '3-vertical', (90, 120), fmt='PNG')
+        self.assertEqual(result.nbytes, len(data))
+        with Image.open(io.BytesIO(data)) as img:
+            self.assertEqual((img.format, img.size), ('PNG', (90, 120)))
+            self.assertEqual(img.getpixel((45, 20)), (255, 0, 0))
+            self.assertEqual(img.getpixel((45, 100)), (0, 0, 255))
+
+    def test_render_collages_per_size_and_format(self):
+        sources = [encoded((i * 60, 0, 0)) for i in range(4)]
+        outputs = render_collages(sources, '4-grid', [(80, 120), (40, 60)], formats=['PNG', 'WEBP'])
+        self.assertEqual(sorted(outputs), [((40, 60), 'PNG'), ((40, 60), 'WEBP'), ((80, 120), 'PNG'), ((80, 120), 'WEBP')])
+        for (size, fmt), (data, result) in outputs.items():
+            with Image.open(io.BytesIO(data)) as img:
+                self.assertEqual((img.format, img.size), (fmt, size))
+
+    def test_wrong_image_count(self):
+        with self.assertRaises(ValueError):
+            render_collage([encoded((0, 0, 0))], '4-grid', (80, 80))
+
+    def test_render_with_cache(self):
+        cache = TileCache()
+        for color in ((255, 0, 0), (0, 0, 255)):
+            data, _ = render_collage([encoded(color)] * 4, '4-grid', (80, 80), fmt='PNG', cache=cache)
+            with Image.open(io.BytesIO(data)) as img:
+                # Uploads of the same size never share cached tiles
+                self.assertEqual(img.getpixel((20, 20)), color)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+from collage.batch import Job, read_manifest, run_batch, percentile
+from unittest import mock
+import tempfile
+from PIL import Image
+import json
+import os
+
+def _kill_worker(job):
+    os._exit(1)
+
+class TestBatch(unittest.TestCase):
+    def test_run_batch(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for i in range(4):
+                Image.new('RGB', (40, 40), (i * 60, 0, 0)).save(os.path.join(tmpdir, f'test{i}.png'))
+            manifest = os.path.join(tmpdir, 'jobs.jsonl')
+            with open(manifest, 'w') as f:
+                f.write(json.dumps({'style': '4-grid', 'images': [f'test{i}.png' for i in range(4)], 'size': '80x60', 'output': 'a.jpg'}) + '\n')
+                f.write(json.dumps({'style': '4-grid', 'images': ['missing.png'] * 4, 'output': 'b.jpg'}) + '\n')
+                f.write(json.dumps({'style': '3-vertical', 'images': [f'test{i}.png' for i in range(3)], 'output': 'c.png'}) + '\n')
+            jobs = list(read_manifest(manifest, (30, 90)))
+            results = sorted(run_batch(jobs, workers=2, executor='thread'), key=lambda r: r.index)
+            self.assertEqual([r.ok for r in results], [True, False, True])
+            with Image.open(os.path.join(tmpdir, 'a.jpg')) as img:
+                self.assertEqual(img.size, (80, 60))
+            with Image.open(os.path.join(tmpdir, 'c.png')) as img:
+                self.assertEqual(img.size, (30, 90))
+            resumed = list(run_batch(jobs, resume=True))
+            self.assertEqual([r.index for r in resumed], [1])
+
+    def test_bad_manifest_lines_fail_alone(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for i in range(3):
+                Image.new('RGB', (40, 40)).save(os.path.join(tmpdir, f'test{i}.png'))
+            good = {'style': '3-vertical', 'images': [f'test{i}.png' for i in range(3)], 'size': '30x90'}
+            manifest = os.path.join(tmpdir, 'jobs.jsonl')
+            with open(manifest, 'w') as f:
+                f.write(json.dumps(dict(good, output='a.png')) + '\n')
+                f.write(json.dumps(dict(good, output='b.png', size='abc')) + '\n')
+                f.write('\n{not json\n')
+                f.write(json.dumps({'style': '3-vertical'}) + '\n')
+                f.write(json.dumps(dict(good, output='c.png')) + '\n')
+            results = list(run_batch(read_manifest(manifest, (30, 90))))
+            self.assertEqual([r.ok for r in results], [True, False, False, False, True])
+            self.assertTrue(results[1].error.startswith('line 2: ValueError'))
+            self.assertTrue(results[2].error.startswith('line 4: JSONDecodeError'))
+            self.assertTrue(results[3].error.startswith('line 5: KeyError'))
+            self.assertTrue(os.path.exists(os.path.join(tmpdir, 'c.png')))
+
+    def test_read_csv_manifest(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            manifest = os.path.join(tmpdir, 'jobs.csv')
+            with open(manifest, 'w') as f:
+                f.write('style,images,size,output\n5-2-3,a.jpg|b.jpg|c.jpg|d.jpg|e.jpg,100x200,out.jpg\n')
+            job, = read_manifest(manifest, (1, 1))
+            self.assertEqual(len(job.images), 5)
+            self.assertEqual(job.output_size, (100, 200))
+            self.assertEqual(job.output, os.path.join(tmpdir, 'out.jpg'))
+
+    def test_dead_worker_fails_jobs(self):
+        jobs = [Job(i, '4-grid', [], (80, 60), f'out{i}.jpg') for i in range(3)]
+        with mock.patch('collage.batch.render_job', _kill_worker):
+            results = list(run_batch(jobs, workers=2, executor='process'))
+        self.assertEqual(sorted(r.index for r in results), [0, 1, 2])
+        self.assertFalse(any(r.ok for r in results))
+        self.assertIn('BrokenProcessPool', results[0].error)
+
+    def test_percentile(self):
+        self.assertEqual(percentile([3.0, 1.0, 2.0, 4.0], 50), 2.0)
+        self.assertEqual(percentile(list(range(1, 101)), 95), 95)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+from collage.cache import TileCache
+from collage.renderer import compose_collage
+from collage.layouts import layout_four_grid
+import tempfile
+from PIL import Image
+import os
+
+class TestCache(unittest.TestCase):
+    def test_lru_byte_budget(self):
+        cache = TileCache(max_bytes=2 * 10 * 10 * 3)
+        for i in range(3):
+            cache.put(('k', i), Image.new('RGB', (10, 10)))
+        self.assertIsNone(cache.get(('k', 0)))
+        self.assertIsNotNone(cache.get(('k', 2)))
+        self.assertEqual(cache.stats()['bytes'], 600)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_compose_collage_reuses_tiles(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'logo.png')
+            Image.new('RGB', (50, 50), (10, 200, 30)).save(path)
+            output_size = (100, 100)
+            positions = layout_four_grid(output_size)
+            cache = TileCache(cache_dir=os.path.join(tmpdir, 'tiles'))
+            first = compose_collage([path] * 4, positions, output_size, cache=cache)
+            self.assertEqual((cache.hits, cache.misses), (0, 1))
+            compose_collage([path] * 4, positions, output_size, cache=cache)
+            self.assertEqual(cache.hits, 1)
+            disk_cache = TileCache(cache_dir=cache.cache_dir)
+            second = compose_collage([path] * 4, positions, output_size, cache=disk_cache)
+            self.assertEqual(disk_cache.disk_hits, 1)
+            self.assertEqual(first.tobytes(), second.tobytes())
+
+    def test_failed_disk_write_is_ignored(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = TileCache(cache_dir=tmpdir)
+            key = (('x', 0, 0), (4, 4), 'lanczos', ())
+            # A file where the blob's directory should go makes the write fail
+            with open(os.path.dirname(cache._blob_path(key)), 'w'):
+                pass
+            img = Image.new('RGB', (4, 4))
+            cache.put(key, img)
+            self.assertIs(cache.get(key), img)
+
+    def test_key_changes_with_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'a.png')
+            Image.new('RGB', (5, 5)).save(path)
+            cache = TileCache()
+            key = cache.key(path, (5, 5))
+            Image.new('RGB', (6, 6)).save(path)
+            self.assertNotEqual(key, cache.key(path, (5, 5)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+from collage.color import load_profile, srgb_profile, transform_for
+from collage.encode import encode
+from collage.layouts import layout_five_two_three
+from collage.renderer import compose_collage
+from collage.store import SourceStore
+from collage.stream import save_collage_streaming
+import io
+import os
+import tempfile
+from PIL import Image, ImageCms
+
+def linear_profile() -> bytes:
+    # sRGB primaries with a linear tone curve: mid grey is much darker than in sRGB
+    data = bytearray(srgb_profile())
+    data[520:552] = b'para' + bytes(8) + b'\x00\x01\x00\x00' + bytes(16)
+    return bytes(data)
+
+class TestColor(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.paths = []
+        for i in range(5):
+            path = os.path.join(self.tmpdir.name, f'test{i}.jpg')
+            profile = linear_profile() if i == 0 else None
+            Image.new('RGB', (300, 200), (128, 128, 128)).save(path, quality=95, icc_profile=profile)
+            self.paths.append(path)
+        self.output_size = (200, 300)
+        self.positions = layout_five_two_three(self.output_size)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_sources_converted_into_output_profile(self):
+        collage = compose_collage(self.paths, self.positions, self.output_size, color=srgb_profile())
+        self.assertEqual(collage.info['icc_profile'], srgb_profile())
+        x, y, w, h = self.positions[0]
+        self.assertGreater(collage.getpixel((x + w // 2, y + h // 2))[0], 180)
+        # Untagged photos are taken as sRGB and left alone
+        x, y, w, h = self.positions[1]
+        self.assertLess(abs(collage.getpixel((x + w // 2, y + h // 2))[0] - 128), 3)
+        # Without a profile pixels are used as they are
+        plain = compose_collage(self.paths, self.positions, self.output_size)
+        x, y, w, h = self.positions[0]
+        self.assertLess(abs(plain.getpixel((x + w // 2, y + h // 2))[0] - 128), 3)
+        self.assertNotIn('icc_profile', plain.info)
+
+    def test_non_rgb_source_profile_taken_as_srgb(self):
+        lab = ImageCms.ImageCmsProfile(ImageCms.createProfile('LAB')).tobytes()
+        path = os.path.join(self.tmpdir.name, 'gray.jpg')
+        Image.new('L', (300, 200), 128).save(path, icc_profile=lab)
+        paths = self.paths[1:] + [path]
+        collage = compose_collage(paths, self.positions, self.output_size, color=srgb_profile())
+        x, y, w, h = self.positions[4]
+        self.assertLess(abs(collage.getpixel((x + w // 2, y + h // 2))[0] - 128), 3)
+        # Output profiles must be RGB
+        profile_path = os.path.join(self.tmpdir.name, 'lab.icc')
+        with open(profile_path, 'wb') as f:
+            f.write(lab)
+        with self.assertRaises(ValueError):
+            load_profile(profile_path)
+
+    def test_transform_built_once_per_profile_pair(self):
+        transform_for.cache_clear()
+        compose_collage(self.paths + self.paths[:1], self.positions + self.positions[:1], self.output_size, color=srgb_profile())
+        self.assertEqual(transform_for.cache_info().misses, 2)
+        self.assertIsNone(transform_for(srgb_profile(), srgb_profile()))
+
+    def test_profile_embedded_in_output(self):
+        collage = compose_collage(self.paths, self.positions, self.output_size, color=srgb_profile())
+        for fmt in ('JPEG', 'PNG', 'WEBP'):
+            data, _ = encode(collage, fmt)
+            with Image.open(io.BytesIO(data)) as img:
+                self.assertEqual(img.info.get('icc_profile'), srgb_profile())
+        path = os.path.join(self.tmpdir.name, 'stream.png')
+        save_collage_streaming(path, self.paths, self.positions, self.output_size, color=srgb_profile())
+        with Image.open(path) as img:
+            self.assertEqual(img.info.get('icc_profile'), srgb_profile())
+            streamed = img.convert('RGB')
+        self.assertEqual(streamed.tobytes(), collage.tobytes())
+
+    def test_store_keeps_source_profile(self):
+        store = SourceStore(os.path.join(self.tmpdir.name, 'store'))
+        store.ingest(self.paths[0], [1])
+        self.assertEqual(store.open(self.paths[0], (10, 10)).info['icc_profile'], linear_profile())
+        decoded = compose_collage(self.paths, self.positions, self.output_size, color=srgb_profile())
+        stored = compose_collage(self.paths, self.positions, self.output_size, color=srgb_profile(), store=store)
+        self.assertEqual(stored.tobytes(), decoded.tobytes())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+from collage.compositor import TileStyle, outside_mask, paint_frame, photo_rect
+from collage.layouts import layout_five_two_three
+from collage.renderer import compose_collage
+from collage.stream import render_bands
+import os
+import tempfile
+from PIL import Image
+
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+GREEN = (0, 255, 0)
+
+class TestCompositor(unittest.TestCase):
+    def test_outside_mask(self):
+        mask = outside_mask(8, 8, 0)
+        self.assertEqual(mask.size, (8, 8))
+        # Fully outside at the canvas corner, fully inside next to the arc's centre
+        self.assertEqual(mask.getpixel((0, 0)), 255)
+        self.assertEqual(mask.getpixel((7, 7)), 0)
+        self.assertEqual(outside_mask(8, 8, 2).getpixel((7, 7)), 255)
+        self.assertIs(outside_mask(8, 8, 0), mask)
+
+    def test_paint_frame(self):
+        style = TileStyle(radius=10, border=3, border_color=RED, background=BLUE)
+        canvas = Image.new('RGB', (40, 30), GREEN)
+        rect = (0, 0, 40, 30)
+        self.assertEqual(photo_rect(rect, style), (3, 3, 34, 24))
+        paint_frame(canvas, rect, style)
+        self.assertEqual(canvas.getpixel((0, 0)), BLUE)
+        self.assertEqual(canvas.getpixel((20, 1)), RED)
+        self.assertEqual(canvas.getpixel((38, 15)), RED)
+        self.assertEqual(canvas.getpixel((4, 4)), RED)
+        self.assertEqual(canvas.getpixel((20, 15)), GREEN)
+        # A band of the same canvas gets the same pixels
+        band = Image.new('RGB', (40, 10), GREEN)
+        paint_frame(band, rect, style, dy=20)
+        self.assertEqual(band.tobytes(), canvas.crop((0, 20, 40, 30)).tobytes())
+
+    def test_compose_with_style(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_paths = []
+            for i in range(5):
+                path = os.path.join(tmpdir, f'test{i}.png')
+                Image.new('RGB', (300, 200 + 30 * i), GREEN).save(path)
+                img_paths.append(path)
+            output_size = (200, 300)
+            positions = layout_five_two_three(output_size)
+            style = TileStyle(gutter=6, margin=4, radius=12, border=2, border_color=RED, background=BLUE)
+            collage = compose_collage(img_paths, positions, output_size, tile_style=style)
+            self.assertEqual(collage.getpixel((2, 150)), BLUE)
+            self.assertEqual(collage.getpixel((100, 150)), BLUE)
+            self.assertEqual(collage.getpixel((5, 5)), BLUE)
+            self.assertEqual(collage.getpixel((50, 4)), RED)
+            self.assertEqual(collage.getpixel((50, 50)), GREEN)
+            streamed = Image.new('RGB', output_size)
+            top = 0
+            for band in render_bands(img_paths, positions, output_size, band_height=64, tile_style=style):
+                streamed.paste(band, (0, top))
+                top += band.height
+            self.assertEqual(streamed.tobytes(), collage.tobytes())
+
+if __name__ == '__main__':
+    unittest.main()
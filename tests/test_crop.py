@@ -0,0 +1,37 @@
+import unittest
+from collage.crop import choose_crop, contain_rect, cover_window
+from collage.renderer import compose_collage
+import tempfile
+from PIL import Image, ImageDraw
+import os
+
+class TestCrop(unittest.TestCase):
+    def test_cover_window(self):
+        self.assertEqual(cover_window((400, 100), (100, 100)), (100, 100))
+        self.assertEqual(cover_window((100, 400), (200, 100)), (100, 50))
+
+    def test_contain_rect(self):
+        self.assertEqual(contain_rect((400, 100), (10, 20, 100, 100)), (10, 57, 100, 25))
+
+    def test_saliency_finds_subject(self):
+        img = Image.new('RGB', (400, 100), (128, 128, 128))
+        ImageDraw.Draw(img).ellipse((300, 20, 360, 80), fill=(250, 20, 20))
+        self.assertEqual(choose_crop(img, (100, 100)), (150.0, 0, 250.0, 100))
+        for mode in ('saliency', 'entropy'):
+            left, top, right, bottom = choose_crop(img, (100, 100), mode)
+            self.assertEqual(right - left, 100)
+            self.assertTrue(left <= 300 and right >= 360, mode)
+
+    def test_compose_fit_modes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'wide.png')
+            Image.new('RGB', (400, 100), (0, 0, 255)).save(path)
+            positions = [(0, 0, 100, 100)]
+            cover = compose_collage([path], positions, (100, 100), fit='cover')
+            self.assertEqual(cover.getpixel((50, 5)), (0, 0, 255))
+            contain = compose_collage([path], positions, (100, 100), fit='contain')
+            self.assertEqual(contain.getpixel((50, 5)), (255, 255, 255))
+            self.assertEqual(contain.getpixel((50, 50)), (0, 0, 255))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from collage.encode import PRESETS, encode, parse_file_size, save_image
+import io
+import tempfile
+from PIL import Image, ImageDraw
+import os
+
+def sample_image():
+    img = Image.linear_gradient('L').resize((320, 240)).convert('RGB')
+    draw = ImageDraw.Draw(img)
+    for i in range(0, 320, 20):
+        draw.ellipse((i, i % 240, i + 30, i % 240 + 30), fill=(200, i % 255, 90))
+    return img
+
+class TestEncode(unittest.TestCase):
+    def test_presets_round_trip(self):
+        img = sample_image()
+        for fmt in ('JPEG', 'WEBP', 'PNG'):
+            for preset in PRESETS:
+                data, result = encode(img, fmt, preset)
+                self.assertEqual(result.nbytes, len(data))
+                with Image.open(io.BytesIO(data)) as decoded:
+                    self.assertEqual((decoded.format, decoded.size), (fmt, img.size))
+
+    def test_target_size(self):
+        img = sample_image()
+        full, _ = encode(img, 'JPEG', 'archival')
+        target = len(full) // 2
+        data, result = encode(img, 'JPEG', 'archival', target_size=target)
+        self.assertLessEqual(len(data), target)
+        self.assertLess(result.quality, PRESETS['archival'].quality)
+        # One quality step up no longer fits
+        bigger, _ = encode(img, 'JPEG', PRESETS['archival']._replace(quality=result.quality + 1))
+        self.assertGreater(len(bigger), target)
+        with self.assertRaises(ValueError):
+            encode(img, 'PNG', target_size=target)
+
+    def test_save_image_format_from_path(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'out.webp')
+            result = save_image(sample_image(), path, preset='web')
+            self.assertEqual(result.format, 'WEBP')
+            self.assertEqual(os.path.getsize(path), result.nbytes)
+
+    def test_module_not_shadowed_by_package(self):
+        import collage
+        import collage.encode as module
+        self.assertIs(module.PRESETS, PRESETS)
+        self.assertIs(collage.encode, module)
+
+    def test_parse_file_size(self):
+        self.assertEqual(parse_file_size('250000'), 250000)
+        self.assertEqual(parse_file_size('300K'), 300 * 1024)
+        self.assertEqual(parse_file_size('1.5mb'), 3 * 2**19)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,5 @@
 import unittest
-from collage.layouts import layout_three_vertical, layout_four_vertical, layout_four_grid, layout_five_two_three
+from collage.layouts import LAYOUTS, layout_auto, layout_for_style, compile_layout, cols, inset_rects, layout_dividers, move_divider, rows, layout_three_vertical, layout_four_vertical, layout_four_grid, layout_five_two_three
 
 class TestLayouts(unittest.TestCase):
     def test_three_vertical(self):
@@ -24,5 +24,48 @@ class TestLayouts(unittest.TestCase):
         positions = layout_five_two_three(output_size)
         self.assertEqual(len(positions), 5)
 
+    def test_layouts_tile_canvas_exactly(self):
+        for output_size in [(1080, 1920), (1001, 997), (7, 11)]:
+            for name in LAYOUTS:
+                covered = [[0] * output_size[0] for _ in range(output_size[1])]
+                for x, y, w, h in compile_layout(name, output_size):
+                    for row in covered[y:y + h]:
+                        for i in range(x, x + w):
+                            row[i] += 1
+                self.assertTrue(all(c == 1 for row in covered for c in row), (name, output_size))
+
+    def test_nested_weights(self):
+        layout = cols((2, rows(1, 1)), 1)
+        self.assertEqual(compile_layout(layout, (300, 100)), ((0, 0, 200, 50), (0, 50, 200, 50), (200, 0, 100, 100)))
+        self.assertIs(compile_layout(layout, (300, 100)), compile_layout(layout, (300, 100)))
+
+    def test_move_divider(self):
+        divider = layout_dividers('5-2-3', (100, 300))[0]
+        self.assertEqual((divider.path, divider.index, divider.direction, divider.position), ((0,), 0, 'rows', 150))
+        moved = move_divider('5-2-3', divider, 30)
+        rects = compile_layout(moved, (100, 300))
+        self.assertEqual(rects[:2], ((0, 0, 50, 180), (0, 180, 50, 120)))
+        self.assertEqual(rects[2:], compile_layout('5-2-3', (100, 300))[2:])
+        self.assertIsNone(move_divider('5-2-3', divider, 149, min_size=2))
+
+    def test_auto_layout(self):
+        aspects = [4 / 3, 3 / 4, 1, 16 / 9, 9 / 16, 3 / 2] * 7
+        positions = layout_for_style('auto', (1080, 1920), aspects)
+        self.assertEqual(len(positions), len(aspects))
+        self.assertEqual(sum(w * h for x, y, w, h in positions), 1080 * 1920)
+        for (x, y, w, h), aspect in zip(positions, aspects):
+            self.assertLess(abs(w / h / aspect - 1), 0.2)
+        # Rows are justified: photos in a row share a height
+        tree = layout_auto(aspects, (1080, 1920))
+        self.assertEqual(sum(len(row.children) for row in tree.children), len(aspects))
+
+    def test_inset_rects(self):
+        rects = layout_for_style('4-grid', (100, 61))
+        inset = inset_rects(rects, (100, 61), 5, margin=2)
+        self.assertEqual(inset, [(2, 2, 45, 25), (52, 2, 46, 25), (2, 32, 45, 27), (52, 32, 46, 27)])
+        self.assertEqual(inset_rects(rects, (100, 61), 0), rects)
+        with self.assertRaises(ValueError):
+            inset_rects(rects, (100, 61), 60)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from collage import profile
+from collage.encode import encode
+from collage.layouts import layout_five_two_three
+from collage.renderer import compose_collage, compose_sizes
+import io
+import json
+import tempfile
+from PIL import Image
+import os
+
+class TestProfile(unittest.TestCase):
+    def test_disabled_is_shared_no_op(self):
+        self.assertFalse(profile.enabled())
+        self.assertIs(profile.stage('decode'), profile.stage('resize'))
+
+    def test_breakdown_and_json_lines(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_paths = []
+            for i in range(5):
+                path = os.path.join(tmpdir, f'test{i}.png')
+                Image.new('RGB', (100, 100), (i * 50, 0, 0)).save(path)
+                img_paths.append(path)
+            output_size = (200, 300)
+            breakdown = profile.Breakdown()
+            log = io.StringIO()
+            with profile.hooked(breakdown, profile.json_lines(log)):
+                collage = compose_collage(img_paths, layout_five_two_three(output_size), output_size)
+                data, _ = encode(collage, 'PNG')
+            self.assertFalse(profile.enabled())
+            stages = breakdown.stages
+            self.assertEqual(list(stages), ['decode', 'resize', 'paste', 'encode'])
+            self.assertEqual([stages[name]['calls'] for name in stages], [5, 5, 5, 1])
+            self.assertEqual(stages['decode']['pixels'], 5 * 100 * 100)
+            self.assertEqual(stages['paste']['pixels'], 200 * 300)
+            self.assertEqual(stages['encode']['bytes'], len(data))
+            events = [json.loads(line) for line in log.getvalue().splitlines()]
+            self.assertEqual(len(events), 16)
+            self.assertIn('resize', breakdown.report())
+
+            # Several sizes decode each source once and reduce it per size
+            breakdown = profile.Breakdown()
+            with profile.hooked(breakdown):
+                compose_sizes(img_paths, [(size, layout_five_two_three(size)) for size in [(200, 300), (100, 150), (50, 75)]])
+            self.assertEqual(breakdown.stages['decode']['calls'], 5)
+            self.assertEqual(breakdown.stages['reduce']['calls'], 15)
+
+if __name__ == '__main__':
+    unittest.main()
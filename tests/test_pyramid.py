@@ -0,0 +1,26 @@
+import unittest
+from collage.pyramid import Pyramid
+from collage.renderer import load_tile
+from PIL import Image, ImageChops, ImageStat
+
+class TestPyramid(unittest.TestCase):
+    def test_level_for(self):
+        pyramid = Pyramid(Image.new('RGB', (1001, 600)))
+        self.assertEqual(pyramid.level_for((1001, 600)).size, (1001, 600))
+        self.assertEqual(len(pyramid.levels), 1)
+        self.assertEqual(pyramid.level_for((250, 100)).size, (251, 150))
+        self.assertEqual([img.size for img in pyramid.levels], [(1001, 600), (501, 300), (251, 150)])
+        self.assertEqual(pyramid.level_for((252, 100)).size, (501, 300))
+        self.assertEqual(pyramid.level_for((2000, 2000)).size, (1001, 600))
+
+    def test_tile_from_pyramid_matches_full_resolution(self):
+        base = Image.linear_gradient('L').resize((2400, 1800)).convert('RGB')
+        pyramid = Pyramid(base)
+        for fit in ('stretch', 'cover'):
+            full = load_tile(base, (270, 320), draft=False, fit=fit)
+            reduced = load_tile(pyramid, (270, 320), fit=fit)
+            diff = ImageStat.Stat(ImageChops.difference(full, reduced)).mean
+            self.assertLess(max(diff), 1.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from collage.render_cache import RenderCache
+from collage.utils import probe_images
+import os
+import tempfile
+import time
+from PIL import Image
+
+class TestRenderCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.sources = []
+        for i in range(2):
+            path = os.path.join(self.tmpdir.name, f'test{i}.png')
+            Image.new('RGB', (30, 20), (40 * i, 0, 0)).save(path)
+            self.sources.append(path)
+        self.cache = RenderCache(os.path.join(self.tmpdir.name, 'cache'))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def output(self, name, data):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_key(self):
+        spec = {'rects': [(0, 0, 10, 10), (0, 10, 10, 10)], 'output_size': (10, 20), 'format': 'JPEG', 'color': b'profile'}
+        key = self.cache.key(self.sources, **spec)
+        self.assertEqual(self.cache.key(self.sources, probe_images(self.sources), **spec), key)
+        self.assertNotEqual(self.cache.key(self.sources, **dict(spec, format='PNG')), key)
+        self.assertNotEqual(self.cache.key(self.sources[::-1], **spec), key)
+        os.utime(self.sources[0], ns=(0, 0))
+        self.assertNotEqual(self.cache.key(self.sources, **spec), key)
+        # Content hashes survive touches
+        hashed = RenderCache(self.cache.root, content_hash=True)
+        key = hashed.key(self.sources, **spec)
+        os.utime(self.sources[0])
+        self.assertEqual(hashed.key(self.sources, **spec), key)
+
+    def test_get_and_put(self):
+        dest = os.path.join(self.tmpdir.name, 'dest.jpg')
+        self.assertFalse(self.cache.get('ab' * 32, dest))
+        self.assertFalse(os.path.exists(dest))
+        self.cache.put('ab' * 32, self.output('out.jpg', b'collage'))
+        self.assertTrue(self.cache.get('ab' * 32, dest))
+        with open(dest, 'rb') as f:
+            self.assertEqual(f.read(), b'collage')
+        # Copied by default: a separate, writable file
+        self.assertEqual(os.stat(dest).st_nlink, 1)
+        self.assertTrue(os.stat(dest).st_mode & 0o200)
+        linked = RenderCache(self.cache.root, link=True)
+        self.assertTrue(linked.get('ab' * 32, dest))
+        self.assertEqual(os.stat(dest).st_nlink, 2)
+
+    def test_evicts_least_recently_used(self):
+        cache = RenderCache(self.cache.root, max_bytes=25)
+        for i, key in enumerate(['aa' * 32, 'bb' * 32]):
+            cache.put(key, self.output(f'{i}.jpg', b'x' * 10))
+            time.sleep(0.01)
+        self.assertTrue(cache.get('aa' * 32, os.path.join(self.tmpdir.name, 'hit.jpg')))
+        time.sleep(0.01)
+        cache.put('cc' * 32, self.output('2.jpg', b'x' * 10))
+        dest = os.path.join(self.tmpdir.name, 'dest.jpg')
+        self.assertFalse(cache.get('bb' * 32, dest))
+        self.assertTrue(cache.get('aa' * 32, dest))
+        self.assertTrue(cache.get('cc' * 32, dest))
+
+if __name__ == '__main__':
+    unittest.main()
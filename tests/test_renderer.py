@@ -1,8 +1,11 @@
 import unittest
-from collage.renderer import compose_collage
-from collage.layouts import layout_three_vertical
+from collage.renderer import Composition, compose_collage, compose_sizes, load_source, load_tile
+from collage.utils import probe_images
+from collage.compositor import TileStyle
+from collage.layouts import compile_layout, layout_dividers, move_divider, layout_for_style, layout_three_vertical, layout_five_two_three
+from collage.profile import Breakdown, hooked
 import tempfile
-from PIL import Image
+from PIL import Image, ImageChops, ImageOps, ImageStat
 import os
 
 class TestRenderer(unittest.TestCase):
@@ -19,5 +22,111 @@ class TestRenderer(unittest.TestCase):
             collage = compose_collage(img_paths, positions, output_size)
             self.assertEqual(collage.size, output_size)
 
+    def test_parallel_matches_serial(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_paths = []
+            for i in range(5):
+                path = os.path.join(tmpdir, f'test{i}.png')
+                Image.new('RGB', (100, 100), (i * 50, 0, 0)).save(path)
+                img_paths.append(path)
+            output_size = (200, 300)
+            positions = layout_five_two_three(output_size)
+            serial = compose_collage(img_paths, positions, output_size)
+            threaded = compose_collage(img_paths, positions, output_size, workers=3)
+            self.assertEqual(serial.tobytes(), threaded.tobytes())
+
+    def test_decoded_sources_match_paths(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_paths = []
+            for i in range(5):
+                path = os.path.join(tmpdir, f'test{i}.png')
+                Image.linear_gradient('L').resize((400, 300 + i * 40)).convert('RGB').save(path)
+                img_paths.append(path)
+            output_size = (200, 300)
+            positions = layout_five_two_three(output_size)
+            sources = [load_source(path, output_size, fit='cover') for path in img_paths]
+            for fit in ('stretch', 'cover', 'contain'):
+                from_paths = compose_collage(img_paths, positions, output_size, fit=fit)
+                from_sources = compose_collage(sources, positions, output_size, fit=fit, infos=probe_images(img_paths))
+                self.assertEqual(from_paths.tobytes(), from_sources.tobytes())
+
+    def test_compose_sizes_matches_single_renders(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_paths = []
+            for i in range(5):
+                path = os.path.join(tmpdir, f'test{i}.jpg')
+                Image.linear_gradient('L').resize((1600, 1200 + i * 100)).convert('RGB').save(path)
+                img_paths.append(path)
+            layouts = [(size, layout_for_style('5-2-3', size)) for size in [(540, 960), (360, 640), (135, 240)]]
+            for fit in ('stretch', 'cover'):
+                collages = compose_sizes(img_paths, layouts, fit=fit)
+                for (size, positions), collage in zip(layouts, collages):
+                    single = compose_collage(img_paths, positions, size, fit=fit)
+                    self.assertEqual(collage.size, size)
+                    diff = ImageStat.Stat(ImageChops.difference(single, collage)).mean
+                    self.assertLess(max(diff), 1.0)
+
+    def test_exif_orientation(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            stored = Image.linear_gradient('L').resize((800, 400)).convert('RGB')
+            for orientation in range(1, 9):
+                path = os.path.join(tmpdir, f'test{orientation}.jpg')
+                exif = Image.Exif()
+                exif[0x0112] = orientation
+                stored.save(path, exif=exif, quality=95)
+                with Image.open(path) as img:
+                    upright = ImageOps.exif_transpose(img).convert('RGB')
+                size = (upright.width // 4, upright.height // 4)
+                self.assertEqual(probe_images([path])[0].display_size, upright.size)
+                diff = ImageStat.Stat(ImageChops.difference(upright.resize(size, Image.Resampling.LANCZOS), load_tile(path, size))).mean
+                self.assertLess(max(diff), 1.0)
+
+    def test_draft_decode_matches_full_decode(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'large.jpg')
+            Image.linear_gradient('L').resize((2400, 1800)).convert('RGB').save(path)
+            full = load_tile(path, (270, 320), draft=False)
+            drafted = load_tile(path, (270, 320))
+            diff = ImageStat.Stat(ImageChops.difference(full, drafted)).mean
+            self.assertEqual(drafted.size, (270, 320))
+            self.assertLess(max(diff), 1.0)
+
+    def test_composition_repastes_changed_tiles(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_paths = []
+            for i in range(6):
+                path = os.path.join(tmpdir, f'test{i}.png')
+                Image.effect_noise((200 + 20 * i, 150), 40 + 10 * i).convert('RGB').save(path)
+                img_paths.append(path)
+            output_size = (300, 400)
+            composition = Composition()
+            def render(paths, positions, style=TileStyle(gutter=4, radius=6)):
+                breakdown = Breakdown()
+                with hooked(breakdown):
+                    collage = composition.render(paths, positions, output_size, fit='cover', tile_style=style)
+                self.assertEqual(collage.tobytes(), compose_collage(paths, positions, output_size, fit='cover', tile_style=style).tobytes())
+                return breakdown.stages.get('paste', {}).get('calls', 0)
+            layout = '5-2-3'
+            positions = compile_layout(layout, output_size)
+            self.assertEqual(render(img_paths[:5], positions), 5)
+            self.assertEqual(render(img_paths[:5], positions), 0)
+            # A swapped photo
+            swapped = img_paths[:4] + img_paths[5:]
+            self.assertEqual(render(swapped, positions), 1)
+            # A moved divider touches the two tiles next to it
+            divider = layout_dividers(layout, output_size)[0]
+            moved = compile_layout(move_divider(layout, divider, 30), output_size)
+            self.assertEqual(render(swapped, moved), 2)
+            # Other options start over
+            self.assertEqual(render(swapped, moved, TileStyle(gutter=2)), 5)
+
+    def test_unknown_fit_rejected(self):
+        sources = [Image.new('RGB', (10, 10))] * 3
+        positions = layout_three_vertical([(10, 10)] * 3, (30, 30))
+        with self.assertRaises(ValueError):
+            compose_collage(sources, positions, (30, 30), fit='bogus')
+        with self.assertRaises(ValueError):
+            Composition().render(sources, positions, (30, 30), fit='bogus')
+
 if __name__ == '__main__':
     unittest.main()
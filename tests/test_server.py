@@ -0,0 +1,148 @@
+import unittest
+from ui.server import HTTPError, RenderServer
+from unittest import mock
+import asyncio
+import base64
+import io
+import json
+import tempfile
+import time
+from PIL import Image
+import os
+
+async def request(port, method, path, body=None, headers=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    data = json.dumps(body).encode() if body is not None else b''
+    lines = [f'{method} {path} HTTP/1.1', 'Host: localhost', f'Content-Length: {len(data)}']
+    lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + data)
+    response = await reader.read()
+    writer.close()
+    head, payload = response.split(b'\r\n\r\n', 1)
+    status_line, *header_lines = head.decode().split('\r\n')
+    out_headers = dict(line.split(': ', 1) for line in header_lines)
+    return int(status_line.split()[1]), out_headers, payload
+
+class TestServer(unittest.TestCase):
+    def test_render_coalesce_and_etag(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for i in range(3):
+                Image.new('RGB', (60, 40), (i * 100, 0, 0)).save(os.path.join(tmpdir, f'test{i}.png'))
+            upload = io.BytesIO()
+            Image.new('RGB', (60, 40), (0, 0, 255)).save(upload, 'PNG')
+            spec = {'style': '4-grid', 'size': '80x60', 'format': 'png',
+                    'images': ['test0.png', 'test1.png', 'test2.png', {'data': base64.b64encode(upload.getvalue()).decode()}]}
+
+            async def run():
+                server = RenderServer(tmpdir, workers=1, executor='thread')
+                listener = await server.start('127.0.0.1', 0)
+                port = listener.sockets[0].getsockname()[1]
+                try:
+                    first, second = await asyncio.gather(request(port, 'POST', '/render', spec), request(port, 'POST', '/render', spec))
+                    cached = await request(port, 'POST', '/render', spec)
+                    revalidated = await request(port, 'POST', '/render', spec, {'If-None-Match': first[1]['ETag']})
+                    outside = await request(port, 'POST', '/render', dict(spec, images=['../x.png'] * 4))
+                    stats = await request(port, 'GET', '/stats')
+                finally:
+                    listener.close()
+                    server.close()
+                return first, second, cached, revalidated, outside, json.loads(stats[2])
+
+            first, second, cached, revalidated, outside, stats = asyncio.run(run())
+            self.assertEqual((first[0], second[0], cached[0]), (200, 200, 200))
+            self.assertEqual(first[2], second[2])
+            self.assertEqual(first[1]['Content-Type'], 'image/png')
+            with Image.open(io.BytesIO(first[2])) as img:
+                self.assertEqual(img.size, (80, 60))
+                self.assertEqual(img.getpixel((60, 45)), (0, 0, 255))
+            self.assertEqual(revalidated[0], 304)
+            self.assertEqual(outside[0], 400)
+            self.assertEqual((stats['renders'], stats['coalesced'], stats['cache_hits'], stats['not_modified']), (1, 1, 1, 1))
+            self.assertEqual(stats['queue_depth'], 0)
+
+    def test_backpressure(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            Image.linear_gradient('L').resize((1600, 1200)).save(os.path.join(tmpdir, 'test.png'))
+            specs = [{'style': '3-vertical', 'size': f'{300 + i}x900', 'images': ['test.png'] * 3} for i in range(3)]
+
+            async def run():
+                server = RenderServer(tmpdir, workers=1, executor='thread', max_pending=1)
+                listener = await server.start('127.0.0.1', 0)
+                port = listener.sockets[0].getsockname()[1]
+                try:
+                    return await asyncio.gather(*[request(port, 'POST', '/render', spec) for spec in specs])
+                finally:
+                    listener.close()
+                    server.close()
+
+            statuses = sorted(status for status, _, _ in asyncio.run(run()))
+            self.assertEqual(statuses, [200, 429, 429])
+
+    def test_malformed_request(self):
+        async def send(port, data):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(data)
+            response = await reader.read()
+            writer.close()
+            return int(response.split(b' ', 2)[1]), json.loads(response.split(b'\r\n\r\n', 1)[1])
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            async def run():
+                server = RenderServer(tmpdir, workers=1, executor='thread')
+                listener = await server.start('127.0.0.1', 0)
+                port = listener.sockets[0].getsockname()[1]
+                try:
+                    garbage = await send(port, b'GARBAGE\r\n\r\n')
+                    length = await send(port, b'POST /render HTTP/1.1\r\nContent-Length: abc\r\n\r\n')
+                    negative = await send(port, b'POST /render HTTP/1.1\r\nContent-Length: -1\r\n\r\n')
+                finally:
+                    listener.close()
+                    server.close()
+                return garbage, length, negative
+
+            for status, payload in asyncio.run(run()):
+                self.assertEqual(status, 400)
+                self.assertEqual(payload, {'error': 'Malformed request'})
+
+    def test_process_workers(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            Image.new('RGB', (60, 40)).save(os.path.join(tmpdir, 'test.png'))
+            specs = [{'style': '3-vertical', 'size': f'{30 + i}x90', 'images': ['test.png'] * 3} for i in range(2)]
+
+            async def run():
+                server = RenderServer(tmpdir, workers=2)
+                listener = await server.start('127.0.0.1', 0)
+                port = listener.sockets[0].getsockname()[1]
+                try:
+                    # Responses end with EOF, so no worker may hold a client's socket
+                    return [await asyncio.wait_for(request(port, 'POST', '/render', spec), 10) for spec in specs]
+                finally:
+                    listener.close()
+                    server.close()
+
+            self.assertEqual([status for status, _, _ in asyncio.run(run())], [200, 200])
+
+    def test_cancelled_render_fails_waiters(self):
+        def slow_render(*args):
+            time.sleep(0.2)
+            return b''
+
+        async def run():
+            server = RenderServer(workers=1, executor='thread')
+            try:
+                first = asyncio.create_task(server.render('key', ((), '4-grid')))
+                await asyncio.sleep(0.01)
+                second = asyncio.create_task(server.render('key', ((), '4-grid')))
+                await asyncio.sleep(0.01)
+                first.cancel()
+                with self.assertRaises(HTTPError) as raised:
+                    await asyncio.wait_for(second, 5)
+                return raised.exception.status, server.inflight
+            finally:
+                server.close()
+
+        with mock.patch('ui.server._render', slow_render):
+            self.assertEqual(asyncio.run(run()), (503, {}))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+from collage.store import SourceStore
+from collage.renderer import compose_collage
+from collage.layouts import layout_five_two_three
+import tempfile
+from PIL import Image
+import os
+
+class TestStore(unittest.TestCase):
+    def test_open_smallest_covering_level(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'test.png')
+            Image.linear_gradient('L').resize((400, 300)).convert('RGB').save(path)
+            store = SourceStore(os.path.join(tmpdir, 'store'))
+            self.assertEqual(store.ingest(path, [1, 2, 4]), [(400, 300), (200, 150), (100, 75)])
+            store.save_index()
+            reopened = SourceStore(store.root)
+            img = reopened.open(path, (150, 100))
+            self.assertEqual((img.mode, img.size), ('RGBX', (200, 150)))
+            # Mapped, not copied
+            self.assertTrue(img.readonly)
+            self.assertIsNone(reopened.open(path, (500, 100)))
+            os.utime(path, ns=(0, 0))
+            self.assertIsNone(reopened.open(path, (150, 100)))
+
+    def test_compose_with_store_matches_decode(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_paths = []
+            for i in range(5):
+                path = os.path.join(tmpdir, f'test{i}.png')
+                Image.linear_gradient('L').resize((300, 200 + i * 30)).convert('RGB').save(path)
+                img_paths.append(path)
+            store = SourceStore(os.path.join(tmpdir, 'store'))
+            for path in img_paths[:3]:
+                store.ingest(path, [1])
+            output_size = (200, 300)
+            positions = layout_five_two_three(output_size)
+            for fit in ('stretch', 'cover'):
+                decoded = compose_collage(img_paths, positions, output_size, fit=fit)
+                stored = compose_collage(img_paths, positions, output_size, fit=fit, store=store)
+                self.assertEqual(decoded.tobytes(), stored.tobytes())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from collage.layouts import STYLE_COUNTS, layout_for_style
+from collage.renderer import compose_collage
+from collage.stream import save_collage_streaming
+import tempfile
+from PIL import Image
+import os
+
+class TestStream(unittest.TestCase):
+    def test_streaming_matches_in_memory(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            img_paths = []
+            for i in range(5):
+                path = os.path.join(tmpdir, f'test{i}.jpg')
+                Image.effect_noise((300 + 40 * i, 700), 40).convert('RGB').save(path)
+                img_paths.append(path)
+            output_size = (500, 1100)
+            for style, count in STYLE_COUNTS.items():
+                positions = layout_for_style(style, output_size)
+                expected = compose_collage(img_paths[:count], positions, output_size)
+                for ext, band_height in (('png', 100), ('ppm', 333)):
+                    out = os.path.join(tmpdir, f'out.{ext}')
+                    save_collage_streaming(out, img_paths[:count], positions, output_size, band_height)
+                    with Image.open(out) as img:
+                        self.assertEqual(img.tobytes(), expected.tobytes(), f'{style} {ext}')
+            positions = layout_for_style('5-2-3', output_size)
+            for fit in ('cover', 'contain'):
+                expected = compose_collage(img_paths, positions, output_size, fit=fit, crop='saliency')
+                out = os.path.join(tmpdir, 'out.png')
+                save_collage_streaming(out, img_paths, positions, output_size, 128, fit=fit, crop='saliency')
+                with Image.open(out) as img:
+                    self.assertEqual(img.tobytes(), expected.tobytes(), fit)
+
+    def test_rejects_jpeg(self):
+        with self.assertRaises(ValueError):
+            save_collage_streaming('out.jpg', [], [], (10, 10))
+
+    def test_unknown_fit_rejected(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'out.png')
+            with self.assertRaises(ValueError):
+                save_collage_streaming(path, [], [], (30, 30), fit='bogus')
+            self.assertFalse(os.path.exists(path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,5 @@
 import unittest
-from collage.utils import validate_images
+from collage.utils import ImageInfo, probe_image, validate_images
 import tempfile
 from PIL import Image
 import os
@@ -16,5 +16,24 @@ class TestUtils(unittest.TestCase):
             self.assertFalse(validate_images(img_paths, 4, 4))
             self.assertFalse(validate_images(['fake.jpg'], 1, 1))
 
+    def test_probe_image(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'rotated.jpg')
+            exif = Image.Exif()
+            exif[0x0112] = 6
+            Image.new('RGB', (40, 30)).save(path, exif=exif)
+            info = probe_image(path)
+            self.assertEqual((info.width, info.height, info.mode, info.format), (40, 30, 'RGB', 'JPEG'))
+            self.assertEqual(info.orientation, 6)
+            self.assertEqual(info.file_size, os.path.getsize(path))
+            with open(os.path.join(tmpdir, 'notes.txt'), 'w') as f:
+                f.write('not an image')
+            with self.assertRaises(OSError):
+                probe_image(os.path.join(tmpdir, 'notes.txt'))
+
+    def test_identity_without_path(self):
+        info = ImageInfo(None, 4, 3, 'RGB', None, 1, 0, 0)
+        self.assertEqual(info.identity, (None, 0, 0))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,63 @@
+import argparse
+import os
+import sys
+import time
+from collage.batch import read_manifest, run_batch, summarize
+from collage.cache import TileCache
+from collage.color import load_profile
+from collage.encode import PRESETS, parse_file_size
+from collage.store import SourceStore
+from collage.utils import parse_size
+from config import COLOR_PROFILE, DEFAULT_OUTPUT_SIZE, SOURCE_STORE
+
+def main():
+    parser = argparse.ArgumentParser(description='Render collages in bulk from a JSONL or CSV manifest.')
+    parser.add_argument('manifest', help='Manifest with style, images, size and output per entry')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='Number of collages rendered in parallel')
+    parser.add_argument('--executor', choices=['thread', 'process'], default='process', help='Worker pool used when --jobs > 1')
+    parser.add_argument('-s', '--size', type=str, default=None, help='Default output size WxH for entries without one')
+    parser.add_argument('--tile-cache', metavar='DIR', default=None, help='Directory for the on-disk resized tile cache (grows without limit)')
+    parser.add_argument('--tile-cache-mb', type=int, default=256, help='Memory budget of the tile cache in MiB')
+    parser.add_argument('--store', metavar='DIR', default=SOURCE_STORE, help='Read pre-decoded sources from this store (see ingest.py)')
+    parser.add_argument('--preset', choices=list(PRESETS), default='fast', help='Encoder settings for entries without a preset')
+    parser.add_argument('--target-size', default=None, help='Largest output file size for entries without one, e.g. 300K')
+    parser.add_argument('--color-profile', metavar='ICC', default=COLOR_PROFILE, help='Convert photos into this output profile (srgb or an .icc file) and embed it')
+    parser.add_argument('--resume', action='store_true', help='Skip entries whose output already exists')
+    args = parser.parse_args()
+
+    try:
+        default_size = parse_size(args.size) if args.size else DEFAULT_OUTPUT_SIZE
+    except Exception:
+        print('Invalid size format. Use WxH, e.g. 1080x1920')
+        sys.exit(1)
+    try:
+        target_size = parse_file_size(args.target_size) if args.target_size else None
+    except ValueError:
+        print('Invalid target size. Use bytes or a K/M suffix, e.g. 300K')
+        sys.exit(1)
+    try:
+        color = load_profile(args.color_profile) if args.color_profile else None
+    except (OSError, ValueError):
+        print(f'Invalid color profile: {args.color_profile}')
+        sys.exit(1)
+
+    cache = TileCache(args.tile_cache_mb * 2**20, cache_dir=args.tile_cache)
+    start = time.perf_counter()
+    results = []
+    jobs = read_manifest(args.manifest, default_size, args.preset, target_size, color)
+    for result in run_batch(jobs, workers=args.jobs, executor=args.executor, resume=args.resume, cache=cache, store=SourceStore(args.store) if args.store else None):
+        results.append(result)
+        if not result.ok:
+            print(f'[{result.index}] failed: {result.error}', file=sys.stderr)
+    stats = summarize(results, time.perf_counter() - start)
+    print(f"{stats['ok']}/{stats['jobs']} collages in {stats['elapsed']:.2f}s "
+          f"({stats['collages_per_sec']:.2f}/s, p50 {stats['p50']*1000:.0f} ms, p95 {stats['p95']*1000:.0f} ms)")
+    print(f"encoded {stats['bytes'] / 2**20:.1f} MiB in {stats['encode_seconds']:.2f}s of worker time")
+    if args.jobs <= 1 or args.executor == 'thread':
+        counters = cache.stats()
+        print(f"tile cache: {counters['hits']} hits, {counters['disk_hits']} disk hits, {counters['misses']} misses")
+    if stats['failed']:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,64 +1,195 @@
 import argparse
-from collage.layouts import layout_three_vertical, layout_four_vertical, layout_four_grid, layout_five_two_three
-from collage.renderer import compose_collage
-from collage.utils import validate_images
-from config import DEFAULT_OUTPUT_SIZE
+import os
+from collage.cache import TileCache
+from collage.color import load_profile
+from collage.compositor import TileStyle, style_rects
+from collage.crop import CROP_MODES, FIT_MODES
+from collage.encode import LOSSY_FORMATS, PRESETS, format_for_path, parse_file_size, save_image
+from collage.layouts import STYLE_COUNTS, STYLES, layout_for_style
+from collage.profile import Breakdown, capture, hooked, json_lines, stage
+from collage.render_cache import RenderCache
+from collage.renderer import compose_collage, compose_sizes
+from collage.store import SourceStore
+from collage.stream import save_collage_streaming
+from collage.utils import parse_color, parse_size, probe_images
+from config import COLOR_PROFILE, DEFAULT_OUTPUT_SIZE, RENDER_CACHE, RENDER_CACHE_MB, SOURCE_STORE
 
 import sys
 
+def output_paths(output, sizes, formats):
+    """
+    Output file names per (size, format): with several sizes the size is
+    appended to the name (collage_720x1280.jpg), and each format replaces
+    the extension.
+    """
+    stem, ext = os.path.splitext(output)
+    paths = []
+    for w, h in sizes:
+        name = f'{stem}_{w}x{h}' if len(sizes) > 1 else stem
+        for fmt in formats or [ext.lstrip('.')]:
+            paths.append(((w, h), f'{name}.{fmt}'))
+    return paths
+
+def replace_output(path, write):
+    """
+    Calls write(tmp) with a temporary path next to path, with the same
+    extension, and moves the file into place, so an existing output
+    (possibly linked from the render cache) is replaced, never rewritten.
+    """
+    stem, ext = os.path.splitext(path)
+    tmp = f'{stem}.{os.getpid()}.tmp{ext}'
+    try:
+        result = write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return result
+
 def main():
     parser = argparse.ArgumentParser(description='Create a photo collage.')
-    parser.add_argument('style', choices=['3-vertical', '4-vertical', '4-grid', '5-2-3', '5-3-2'], help='Collage style')
+    parser.add_argument('style', choices=STYLES, help='Collage style')
     parser.add_argument('images', nargs='+', help='Paths to images')
     parser.add_argument('-o', '--output', default='collage.jpg', help='Output file name')
-    parser.add_argument('-s', '--size', type=str, default=None, help='Output size WxH, e.g. 1080x1920')
+    parser.add_argument('-s', '--size', action='append', default=None, help='Output size WxH, e.g. 1080x1920; repeat for several sizes')
+    parser.add_argument('-f', '--format', action='append', default=None, help='Output format extension, e.g. webp; repeat for several formats')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of tiles to decode and resize in parallel')
+    parser.add_argument('--executor', choices=['thread', 'process'], default='thread', help='Worker pool used when --jobs > 1')
+    parser.add_argument('--fit', choices=FIT_MODES, default='stretch', help='How photos fill their tiles')
+    parser.add_argument('--crop', choices=CROP_MODES, default='center', help='Crop window placement with --fit cover')
+    parser.add_argument('--gutter', type=int, default=0, help='Pixels between tiles')
+    parser.add_argument('--margin', type=int, default=None, help='Pixels around the collage (default: the gutter)')
+    parser.add_argument('--radius', type=int, default=0, help='Corner radius of the tiles in pixels')
+    parser.add_argument('--border', type=int, default=0, help='Border width around each photo in pixels')
+    parser.add_argument('--border-color', type=parse_color, default='white', help='Border color, a name or #rrggbb')
+    parser.add_argument('--background', type=parse_color, default='white', help='Background color behind gutters and corners')
+    parser.add_argument('--stream', action='store_true', help='Write PNG/PPM output band by band without holding the whole canvas')
+    parser.add_argument('--band-height', type=int, default=256, help='Rows per band with --stream')
+    parser.add_argument('--tile-cache', metavar='DIR', default=None, help='Reuse resized tiles from this cache directory (grows without limit)')
+    parser.add_argument('--store', metavar='DIR', default=SOURCE_STORE, help='Read pre-decoded sources from this store (see ingest.py)')
+    parser.add_argument('--render-cache', metavar='DIR', default=RENDER_CACHE, help='Reuse finished collages rendered from identical inputs and options')
+    parser.add_argument('--render-cache-mb', type=int, default=RENDER_CACHE_MB, help='Size limit of the render cache in MiB')
+    parser.add_argument('--cache-link', action='store_true', help='Hard-link outputs to render cache entries instead of copying them (outputs are then read-only)')
+    parser.add_argument('--no-cache', action='store_true', help='Always render, without reading or filling the render cache')
+    parser.add_argument('--preset', choices=list(PRESETS), default='fast', help='Encoder settings for the output file')
+    parser.add_argument('--target-size', default=None, help='Largest output file size, e.g. 300K; JPEG/WebP/AVIF quality is searched to fit')
+    parser.add_argument('--color-profile', metavar='ICC', default=COLOR_PROFILE, help='Convert photos into this output profile (srgb or an .icc file) and embed it')
+    parser.add_argument('--profile', action='store_true', help='Print time and counters per render stage')
+    parser.add_argument('--profile-json', metavar='PATH', default=None, help='Append one JSON line per stage to PATH (- for stderr)')
+    parser.add_argument('--cprofile', metavar='PATH', default=None, help='Run under cProfile and dump the stats to PATH')
+    parser.add_argument('--tracemalloc', action='store_true', help='Report peak Python memory allocated during the render')
     args = parser.parse_args()
 
-    if args.size:
-        try:
-            w, h = map(int, args.size.lower().split('x'))
-            output_size = (w, h)
-        except Exception:
-            print('Invalid size format. Use WxH, e.g. 1080x1920')
-            sys.exit(1)
-    else:
-        output_size = DEFAULT_OUTPUT_SIZE
+    hooks = []
+    breakdown = Breakdown() if args.profile else None
+    if breakdown:
+        hooks.append(breakdown)
+    log = None
+    if args.profile_json:
+        log = sys.stderr if args.profile_json == '-' else open(args.profile_json, 'a')
+        hooks.append(json_lines(log))
+    try:
+        with hooked(*hooks), capture(args.cprofile, args.tracemalloc) as captured:
+            run(args)
+    finally:
+        if log is not None and log is not sys.stderr:
+            log.close()
+    if breakdown:
+        print(breakdown.report())
+    if 'peak_bytes' in captured:
+        print(f"tracemalloc peak {captured['peak_bytes'] / 2**20:.1f} MiB")
 
-    if args.style == '3-vertical':
-        if not validate_images(args.images, 3, 3):
-            print('Provide exactly 3 valid image paths.')
-            sys.exit(1)
-        # For now, equal sizes
-        sizes = [(output_size[0], output_size[1]//3)]*3
-        positions = layout_three_vertical(sizes, output_size)
-    elif args.style == '4-vertical':
-        if not validate_images(args.images, 4, 4):
-            print('Provide exactly 4 valid image paths.')
-            sys.exit(1)
-        positions = layout_four_vertical(output_size)
-    elif args.style == '4-grid':
-        if not validate_images(args.images, 4, 4):
-            print('Provide exactly 4 valid image paths.')
-            sys.exit(1)
-        positions = layout_four_grid(output_size)
-    elif args.style == '5-2-3':
-        if not validate_images(args.images, 5, 5):
-            print('Provide exactly 5 valid image paths.')
-            sys.exit(1)
-        positions = layout_five_two_three(output_size)
-    elif args.style == '5-3-2':
-        if not validate_images(args.images, 5, 5):
-            print('Provide exactly 5 valid image paths.')
-            sys.exit(1)
-        from collage.layouts import layout_five_three_two
-        positions = layout_five_three_two(output_size)
-    else:
-        print('Unknown style.')
+def run(args):
+    try:
+        sizes = list(dict.fromkeys(parse_size(size) for size in args.size)) if args.size else [DEFAULT_OUTPUT_SIZE]
+    except Exception:
+        print('Invalid size format. Use WxH, e.g. 1080x1920')
+        sys.exit(1)
+    if not args.format and not os.path.splitext(args.output)[1].lstrip('.'):
+        print('Output name needs an extension, e.g. collage.jpg, or use --format')
+        sys.exit(1)
+    outputs = output_paths(args.output, sizes, args.format)
+    try:
+        target_size = parse_file_size(args.target_size) if args.target_size else None
+    except ValueError:
+        print('Invalid target size. Use bytes or a K/M suffix, e.g. 300K')
+        sys.exit(1)
+    if target_size and any(format_for_path(path) not in LOSSY_FORMATS for _, path in outputs):
+        print(f'--target-size needs {"/".join(LOSSY_FORMATS)} output files')
+        sys.exit(1)
+    try:
+        color = load_profile(args.color_profile) if args.color_profile else None
+    except (OSError, ValueError):
+        print(f'Invalid color profile: {args.color_profile}')
+        sys.exit(1)
+    tile_style = TileStyle(args.gutter, args.margin, args.radius, args.border, args.border_color, args.background)
+
+    count = STYLE_COUNTS.get(args.style)
+    try:
+        if count and len(args.images) != count:
+            raise ValueError
+        with stage('validate') as s:
+            infos = probe_images(args.images)
+            s.count(images=len(infos))
+    except Exception:
+        print(f'Provide exactly {count} valid image paths.' if count else 'Provide valid image paths.')
+        sys.exit(1)
+    aspects = [info.aspect for info in infos]
+    with stage('layout'):
+        layouts = [(size, layout_for_style(args.style, size, aspects)) for size in sizes]
+    try:
+        for size, positions in layouts:
+            style_rects(positions, size, tile_style)
+    except ValueError as e:
+        print(e)
         sys.exit(1)
 
-    collage = compose_collage(args.images, positions, output_size)
-    collage.save(args.output)
-    print(f'Collage saved to {args.output}')
+    render_cache = RenderCache(args.render_cache, args.render_cache_mb * 2**20, link=args.cache_link) if args.render_cache and not args.no_cache else None
+    keys = {}
+    if render_cache:
+        # Outputs rendered before from the same inputs are copied, not rendered
+        rects = dict(layouts)
+        for size, path in list(outputs):
+            keys[path] = render_cache.key(
+                args.images, infos, rects=rects[size], output_size=size, format=format_for_path(path) or os.path.splitext(path)[1],
+                preset=args.preset, target_size=target_size, fit=args.fit, crop=args.crop, tile_style=tile_style, color=color,
+                stream=args.stream, store=bool(args.store),
+            )
+            if render_cache.get(keys[path], path):
+                print(f'Collage saved to {path} (unchanged, from the render cache)')
+                outputs.remove((size, path))
+        needed = {size for size, _ in outputs}
+        layouts = [(size, positions) for size, positions in layouts if size in needed]
+        if not layouts:
+            return
+
+    if args.stream:
+        # Streaming keeps nothing between sizes, so each one decodes again
+        for size, path in outputs:
+            try:
+                replace_output(path, lambda tmp: save_collage_streaming(tmp, args.images, dict(layouts)[size], size, args.band_height, fit=args.fit, crop=args.crop, compress_level=PRESETS[args.preset].png_compress_level, color=color, tile_style=tile_style))
+            except ValueError as e:
+                print(e)
+                sys.exit(1)
+            if render_cache:
+                render_cache.put(keys[path], path)
+            print(f'Collage saved to {path}')
+        return
+
+    cache = TileCache(cache_dir=args.tile_cache) if args.tile_cache else None
+    store = SourceStore(args.store) if args.store else None
+    if len(layouts) == 1:
+        (output_size, positions), = layouts
+        collages = [compose_collage(args.images, positions, output_size, workers=args.jobs, executor=args.executor, cache=cache, infos=infos, fit=args.fit, crop=args.crop, store=store, color=color, tile_style=tile_style)]
+    else:
+        collages = compose_sizes(args.images, layouts, workers=args.jobs, executor=args.executor, cache=cache, infos=infos, fit=args.fit, crop=args.crop, store=store, color=color, tile_style=tile_style)
+    rendered = {size: collage for (size, _), collage in zip(layouts, collages)}
+    for size, path in outputs:
+        result = replace_output(path, lambda tmp: save_image(rendered[size], tmp, preset=args.preset, target_size=target_size))
+        if render_cache:
+            render_cache.put(keys[path], path)
+        quality = f', quality {result.quality}' if result.quality is not None else ''
+        print(f'Collage saved to {path} ({result.format}, {result.nbytes / 1024:.0f} KiB{quality}, encoded in {result.seconds * 1000:.0f} ms)')
 
 if __name__ == '__main__':
     main()
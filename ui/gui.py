@@ -1,15 +1,54 @@
 import tkinter as tk
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, ttk
 from PIL import Image, ImageTk
-from collage.renderer import compose_collage
+from collage.cache import TileCache
+from collage.crop import CROP_MODES, FIT_MODES, choose_crop, contain_rect
+from collage.encode import PRESETS, parse_file_size, save_image
+from collage.layouts import LAYOUTS, compile_layout, layout_dividers, move_divider
+from collage.pyramid import Pyramid
+from collage.renderer import Composition, load_source, source_size_for
+from collage.utils import probe_image
 from config import DEFAULT_OUTPUT_SIZE
+from ui.tasks import TaskRunner
+
+# Live preview: while dragging, tiles are redrawn at most once per frame
+# with a fast filter; a high-quality pass follows on release, or once
+# things have been still for SETTLE_MS (e.g. after resizing the window)
+FRAME_MS = 16
+SETTLE_MS = 150
+
+def fit_preview(img, size, fit='stretch', crop='center', resample=Image.Resampling.LANCZOS):
+	# Same fit semantics as compose_collage, for the on-screen preview
+	if fit == 'cover':
+		return img.resize(size, resample, box=choose_crop(img, size, crop))
+	if fit == 'contain':
+		_, _, w, h = contain_rect(img.size, (0, 0) + tuple(size))
+		return img.resize((w, h), resample)
+	return img.resize(size, resample)
+
+def load_pyramid(path, output_size):
+	# Decode once, reduced only as far as the whole output canvas allows:
+	# any tile is at most the canvas, so export can resize from this without
+	# reading the file again. Previews resample from the nearest smaller
+	# level of its pyramid.
+	return probe_image(path), Pyramid(load_source(path, output_size, fit='cover'))
+
+def preview_source(pyramid, size, fit):
+	return pyramid.level_for(source_size_for(pyramid.size, size, fit))
 
 class Tile:
-	def __init__(self, master, x, y, w, h, idx, on_image_import):
+	def __init__(self, master, x, y, w, h, idx, on_image_import, tasks, output_size, fit='stretch', crop='center'):
 		self.master = master
+		self.output_size = output_size
+		self.tasks = tasks
+		self.load_task = None
+		self.fit, self.crop = fit, crop
 		self.x, self.y, self.w, self.h = x, y, w, h
 		self.idx = idx
 		self.image_path = None
+		self.info = None
+		self.pyramid = None
+		self.rendered = None
 		self.on_image_import = on_image_import
 		self.frame = tk.Frame(master, width=w, height=h, bg='#ddd', highlightbackground='#888', highlightthickness=1)
 		self.frame.place(x=x, y=y, width=w, height=h)
@@ -22,56 +61,113 @@ class Tile:
 	def import_image(self, event=None):
 		path = filedialog.askopenfilename(filetypes=[('Image Files', '*.jpg *.jpeg *.png *.bmp')])
 		if path:
-			self.image_path = path
-			img = Image.open(path)
-			img = img.resize((self.w, self.h), Image.Resampling.LANCZOS)
-			img_tk = ImageTk.PhotoImage(img)
+			# A newer pick replaces any load still in flight
+			if self.load_task is not None:
+				self.load_task.cancel()
+			self.image_path = None
+			self.info = self.pyramid = None
 			if self.img_label:
 				self.img_label.destroy()
-			self.img_label = tk.Label(self.frame, image=img_tk)
-			self.img_label.image = img_tk
-			self.img_label.pack(expand=True, fill='both')
-			self.img_label.bind('<Button-1>', self.import_image)
-			self.label.pack_forget()
+				self.img_label = None
+			self.label.config(text='Loading...')
+			self.label.pack(expand=True, fill='both')
 			self.on_image_import()
+			size = (self.w, self.h)
+			self.load_task = self.tasks.submit(self._load, path, size,
+				on_done=lambda result: self._loaded(path, size, result),
+				on_error=self._load_failed)
+
+	def _load(self, path, size):
+		# Runs on a worker thread: decode the pyramid and the first preview
+		info, pyramid = load_pyramid(path, self.output_size)
+		return info, pyramid, fit_preview(preview_source(pyramid, size, self.fit), size, self.fit, self.crop)
+
+	def _loaded(self, path, size, result):
+		self.load_task = None
+		if not self.frame.winfo_exists():
+			return
+		self.image_path = path
+		self.info, self.pyramid, img = result
+		self.rendered = size + (False,)
+		img_tk = ImageTk.PhotoImage(img)
+		self.img_label = tk.Label(self.frame, image=img_tk)
+		self.img_label.image = img_tk
+		self.img_label.pack(expand=True, fill='both')
+		self.img_label.bind('<Button-1>', self.import_image)
+		self.label.pack_forget()
+		self.label.config(text=f'Tile {self.idx+1}')
+		# The tile may have been resized while loading
+		self.update_size(self.x, self.y, self.w, self.h)
+		self.on_image_import()
+
+	def _load_failed(self, error):
+		self.load_task = None
+		if self.frame.winfo_exists():
+			self.label.config(text=f'Tile {self.idx+1}')
+			messagebox.showerror('Import', f'Could not open image:\n{error}')
 
-	def update_size(self, x, y, w, h):
+	def update_size(self, x, y, w, h, fast=False):
+		# fast resamples with BILINEAR, for use while dragging
 		self.x, self.y, self.w, self.h = x, y, w, h
 		self.frame.place(x=x, y=y, width=w, height=h)
-		if self.image_path:
-			img = Image.open(self.image_path)
-			img = img.resize((w, h), Image.Resampling.LANCZOS)
+		if self.pyramid is not None and w > 0 and h > 0:
+			# Skip when the image on screen is already good enough
+			if self.rendered in ((w, h, False), (w, h, fast)):
+				return
+			self.rendered = (w, h, fast)
+			resample = Image.Resampling.BILINEAR if fast else Image.Resampling.LANCZOS
+			img = fit_preview(preview_source(self.pyramid, (w, h), self.fit), (w, h), self.fit, self.crop, resample)
 			img_tk = ImageTk.PhotoImage(img)
 			self.img_label.configure(image=img_tk)
 			self.img_label.image = img_tk
 
-class VerticalDragBar:
-	def __init__(self, master, x, y, w, h, on_drag):
+class DragBar:
+	# A divider between two tiles; direction is that of the split it belongs
+	# to, so a 'rows' bar is dragged vertically and a 'cols' bar horizontally
+	def __init__(self, master, x, y, w, h, direction, on_drag, on_release=None):
 		self.master = master
 		self.x, self.y, self.w, self.h = x, y, w, h
+		self.direction = direction
 		self.on_drag = on_drag
-		self.bar = tk.Frame(master, bg='#444', cursor='sb_v_double_arrow')
+		self.on_release = on_release
+		cursor = 'sb_v_double_arrow' if direction == 'rows' else 'sb_h_double_arrow'
+		self.bar = tk.Frame(master, bg='#444', cursor=cursor)
 		self.bar.place(x=x, y=y, width=w, height=h)
 		self.bar.bind('<B1-Motion>', self.drag)
 		self.bar.bind('<Button-1>', self.start_drag)
-		self.start_y = None
+		self.bar.bind('<ButtonRelease-1>', self.end_drag)
+		self.start = None
+
+	def _coord(self, event):
+		return event.y_root if self.direction == 'rows' else event.x_root
 
 	def start_drag(self, event):
-		self.start_y = event.y_root
+		self.start = self._coord(event)
 
 	def drag(self, event):
-		if self.start_y is not None:
-			dy = event.y_root - self.start_y
-			self.on_drag(dy)
-			self.start_y = event.y_root
+		if self.start is not None:
+			delta = self._coord(event) - self.start
+			self.on_drag(delta)
+			self.start = self._coord(event)
+
+	def end_drag(self, event):
+		self.start = None
+		if self.on_release:
+			self.on_release()
 
 	def update_position(self, x, y, w, h):
 		self.x, self.y, self.w, self.h = x, y, w, h
 		self.bar.place(x=x, y=y, width=w, height=h)
 
 class CollageWindow(tk.Toplevel):
-	def __init__(self, master, layout_name, output_size):
+	def __init__(self, master, layout_name, output_size, tasks, tile_cache=None, fit='stretch', crop='center', preset='fast', target_size=None):
 		super().__init__(master)
+		self.tasks = tasks
+		self.tile_cache = tile_cache
+		# The last export, so re-exports only repaste the tiles that changed
+		self.composition = Composition()
+		self.fit, self.crop = fit, crop
+		self.preset, self.target_size = preset, target_size
 		self.title(f'Collage - {layout_name}')
 		self.output_size = output_size
 		self.aspect_ratio = output_size[0] / output_size[1]
@@ -88,8 +184,12 @@ class CollageWindow(tk.Toplevel):
 		self.tiles = []
 		self.drag_bars = []
 		self.images_imported = 0
+		self.exporting = False
+		self._frame_job = None
+		self._settle_job = None
 		self.export_btn = tk.Button(self, text='Export', state='disabled', command=self.export_collage)
 		self.export_btn.pack(side='bottom', fill='x')
+		self.export_progress = ttk.Progressbar(self, mode='determinate', maximum=1.0)
 		self.bind('<Configure>', self.on_resize)
 		self.init_layout(layout_name)
 
@@ -104,7 +204,7 @@ class CollageWindow(tk.Toplevel):
 				h = int(w / aspect)
 			self.canvas.config(width=w, height=h)
 			self.preview_size = (w, h)
-			self.redraw_tiles()
+			self.schedule_redraw()
 
 	def scale_coords(self, x, y, w, h):
 		# Map output size to preview size
@@ -112,419 +212,125 @@ class CollageWindow(tk.Toplevel):
 		prev_w, prev_h = self.preview_size
 		sx = prev_w / out_w
 		sy = prev_h / out_h
-		return int(x * sx), int(y * sy), int(w * sx), int(h * sy)
+		# Scale edges rather than sizes so neighbouring tiles stay flush
+		px, py = round(x * sx), round(y * sy)
+		return px, py, round((x + w) * sx) - px, round((y + h) * sy) - py
 
-	def inv_scale_coords(self, x, y, w, h):
-		# Map preview size to output size
-		out_w, out_h = self.output_size
-		prev_w, prev_h = self.preview_size
-		sx = out_w / prev_w
-		sy = out_h / prev_h
-		return int(x * sx), int(y * sy), int(w * sx), int(h * sy)
+	def bar_rect(self, divider):
+		# 10 px wide bar centered on the divider, in output coordinates
+		x, y, w, h = divider.rect
+		if divider.direction == 'rows':
+			return (x, divider.position - 5, w, 10)
+		return (divider.position - 5, y, 10, h)
 
 	def init_layout(self, layout_name):
-		if layout_name == '3-vertical':
-			self.init_three_vertical()
-		elif layout_name == '4-vertical':
-			self.init_four_vertical()
-		elif layout_name == '4-grid':
-			self.init_four_grid()
-		elif layout_name == '5-2-3':
-			self.init_five_two_three()
-		elif layout_name == '5-3-2':
-			self.init_five_three_two()
-	def init_four_vertical(self):
-		w, h = self.output_size
-		heights = [h//4]*3 + [h - 3*(h//4)]
-		y_positions = [0, heights[0], heights[0]+heights[1], heights[0]+heights[1]+heights[2]]
-		for i in range(4):
-			px, py, pw, ph = self.scale_coords(0, y_positions[i], w, heights[i])
-			tile = Tile(self.canvas, px, py, pw, ph, i, self.check_export)
+		# self.layout is the model, in output coordinates: drags edit it and
+		# both the preview and the export are compiled from it
+		self.layout = LAYOUTS[layout_name]
+		for i, rect in enumerate(compile_layout(self.layout, self.output_size)):
+			px, py, pw, ph = self.scale_coords(*rect)
+			tile = Tile(self.canvas, px, py, pw, ph, i, self.check_export, self.tasks, self.output_size, self.fit, self.crop)
 			self.tiles.append(tile)
-		for i in range(3):
-			px, py, pw, ph = self.scale_coords(0, y_positions[i]+heights[i]-5, w, 10)
-			bar = VerticalDragBar(self.canvas, px, py, pw, ph, lambda dy, idx=i: self.resize_tiles_vertical(idx, dy, 4))
+		for divider in layout_dividers(self.layout, self.output_size):
+			px, py, pw, ph = self.scale_coords(*self.bar_rect(divider))
+			bar = DragBar(self.canvas, px, py, pw, ph, divider.direction, lambda delta, i=len(self.drag_bars): self.drag_divider(i, delta), self.finish_redraw)
 			self.drag_bars.append(bar)
 
-	def resize_tiles_vertical(self, idx, dy, n):
-		prev_h = self.preview_size[1]
-		out_h = self.output_size[1]
-		scale = out_h / prev_h
-		dy_out = int(dy * scale)
-		w, h = self.output_size
-		heights = [self.tiles[i].h for i in range(n)]
-		for i in range(n):
-			_, _, _, ph = self.inv_scale_coords(0, 0, 0, self.tiles[i].h)
-			heights[i] = ph
-		heights[idx] += dy_out
-		heights[idx+1] -= dy_out
-		min_h = int(50 * scale)
-		if heights[idx] < min_h or heights[idx+1] < min_h:
-			return
-		y_positions = [0]
-		for i in range(n-1):
-			y_positions.append(y_positions[-1] + heights[i])
-		for i in range(n):
-			px, py, pw, ph = self.scale_coords(0, y_positions[i], w, heights[i])
-			self.tiles[i].update_size(px, py, pw, ph)
-		for i in range(n-1):
-			px, py, pw, ph = self.scale_coords(0, y_positions[i]+heights[i]-5, w, 10)
-			self.drag_bars[i].update_position(px, py, pw, ph)
-
-	def init_four_grid(self):
-		w, h = self.output_size
-		# Initial split: 2x2 grid
-		widths = [w//2, w - w//2]
-		heights = [h//2, h - h//2]
-		positions = [
-			(0, 0, widths[0], heights[0]),
-			(widths[0], 0, widths[1], heights[0]),
-			(0, heights[0], widths[0], heights[1]),
-			(widths[0], heights[0], widths[1], heights[1])
-		]
-		for i, (x, y, tw, th) in enumerate(positions):
-			px, py, pw, ph = self.scale_coords(x, y, tw, th)
-			tile = Tile(self.canvas, px, py, pw, ph, i, self.check_export)
-			self.tiles.append(tile)
-		# Add vertical and horizontal drag bars
-		# Vertical bar
-		px, py, pw, ph = self.scale_coords(widths[0]-5, 0, 10, h)
-		vbar = VerticalDragBar(self.canvas, px, py, pw, ph, lambda dx: self.resize_grid_vertical(dx, widths, heights))
-		self.drag_bars.append(vbar)
-		# Horizontal bar
-		px, py, pw, ph = self.scale_coords(0, heights[0]-5, w, 10)
-		hbar = VerticalDragBar(self.canvas, px, py, pw, ph, lambda dy: self.resize_grid_horizontal(dy, widths, heights, w, h),)
-		self.drag_bars.append(hbar)
-
-	def resize_grid_vertical(self, dx, widths, heights):
-		prev_w = self.preview_size[0]
-		out_w = self.output_size[0]
-		scale = out_w / prev_w
-		dx_out = int(dx * scale)
-		min_w = int(50 * scale)
-		widths[0] += dx_out
-		widths[1] -= dx_out
-		if widths[0] < min_w or widths[1] < min_w:
-			return
-		w, h = self.output_size
-		positions = [
-			(0, 0, widths[0], heights[0]),
-			(widths[0], 0, widths[1], heights[0]),
-			(0, heights[0], widths[0], heights[1]),
-			(widths[0], heights[0], widths[1], heights[1])
-		]
-		for i, (x, y, tw, th) in enumerate(positions):
-			px, py, pw, ph = self.scale_coords(x, y, tw, th)
-			self.tiles[i].update_size(px, py, pw, ph)
-		# Update drag bars
-		px, py, pw, ph = self.scale_coords(widths[0]-5, 0, 10, h)
-		self.drag_bars[0].update_position(px, py, pw, ph)
-		px, py, pw, ph = self.scale_coords(0, heights[0]-5, w, 10)
-		self.drag_bars[1].update_position(px, py, pw, ph)
-
-	def resize_grid_horizontal(self, dy, widths, heights, w, h):
-		prev_h = self.preview_size[1]
-		out_h = self.output_size[1]
-		scale = out_h / prev_h
-		dy_out = int(dy * scale)
-		min_h = int(50 * scale)
-		heights[0] += dy_out
-		heights[1] -= dy_out
-		if heights[0] < min_h or heights[1] < min_h:
-			return
-		positions = [
-			(0, 0, widths[0], heights[0]),
-			(widths[0], 0, widths[1], heights[0]),
-			(0, heights[0], widths[0], heights[1]),
-			(widths[0], heights[0], widths[1], heights[1])
-		]
-		for i, (x, y, tw, th) in enumerate(positions):
-			px, py, pw, ph = self.scale_coords(x, y, tw, th)
-			self.tiles[i].update_size(px, py, pw, ph)
-		# Update drag bars
-		px, py, pw, ph = self.scale_coords(widths[0]-5, 0, 10, h)
-		self.drag_bars[0].update_position(px, py, pw, ph)
-		px, py, pw, ph = self.scale_coords(0, heights[0]-5, w, 10)
-		self.drag_bars[1].update_position(px, py, pw, ph)
-
-	def init_five_two_three(self):
-		w, h = self.output_size
-		wcol = w // 2
-		h_left = [h//2, h - h//2]
-		h_right = [h//3, h//3, h - 2*(h//3)]
-		# Left column (2 tiles)
-		for i in range(2):
-			px, py, pw, ph = self.scale_coords(0, sum(h_left[:i]), wcol, h_left[i])
-			tile = Tile(self.canvas, px, py, pw, ph, i, self.check_export)
-			self.tiles.append(tile)
-		# Right column (3 tiles)
-		for i in range(3):
-			px, py, pw, ph = self.scale_coords(wcol, sum(h_right[:i]), w-wcol, h_right[i])
-			tile = Tile(self.canvas, px, py, pw, ph, i+2, self.check_export)
-			self.tiles.append(tile)
-		# Drag bars for left column (local list)
-		self.drag_bars_left = []
-		px, py, pw, ph = self.scale_coords(0, h_left[0]-5, wcol, 10)
-		bar_left = VerticalDragBar(self.canvas, px, py, pw, ph, lambda dy: self.resize_tiles_column(dy, h_left, 2, 0, wcol, 0, 'left'))
-		self.drag_bars_left.append(bar_left)
-		# Drag bars for right column (local list)
-		self.drag_bars_right = []
-		for i in range(2):
-			px, py, pw, ph = self.scale_coords(wcol, h_right[i]-5+sum(h_right[:i]), w-wcol, 10)
-			bar = VerticalDragBar(self.canvas, px, py, pw, ph, lambda dy, idx=i: self.resize_tiles_column(dy, h_right, 3, 2, w-wcol, idx, 'right'))
-			self.drag_bars_right.append(bar)
-
-	def init_five_three_two(self):
-		w, h = self.output_size
-		wcol = w // 2
-		h_left = [h//3, h//3, h - 2*(h//3)]
-		h_right = [h//2, h - h//2]
-		# Left column (3 tiles)
-		for i in range(3):
-			px, py, pw, ph = self.scale_coords(0, sum(h_left[:i]), wcol, h_left[i])
-			tile = Tile(self.canvas, px, py, pw, ph, i, self.check_export)
-			self.tiles.append(tile)
-		# Right column (2 tiles)
-		for i in range(2):
-			px, py, pw, ph = self.scale_coords(wcol, sum(h_right[:i]), w-wcol, h_right[i])
-			tile = Tile(self.canvas, px, py, pw, ph, i+3, self.check_export)
-			self.tiles.append(tile)
-		# Drag bars for left column (local list)
-		self.drag_bars_left = []
-		for i in range(2):
-			px, py, pw, ph = self.scale_coords(0, h_left[i]-5+sum(h_left[:i]), wcol, 10)
-			bar = VerticalDragBar(self.canvas, px, py, pw, ph, lambda dy, idx=i: self.resize_tiles_column(dy, h_left, 3, 0, wcol, idx, 'left'))
-			self.drag_bars_left.append(bar)
-		# Drag bar for right column (local list)
-		self.drag_bars_right = []
-		px, py, pw, ph = self.scale_coords(wcol, h_right[0]-5, w-wcol, 10)
-		bar_right = VerticalDragBar(self.canvas, px, py, pw, ph, lambda dy: self.resize_tiles_column(dy, h_right, 2, 3, w-wcol, 0, 'right'))
-		self.drag_bars_right.append(bar_right)
-
-	def resize_tiles_column(self, dy, heights, n, tile_offset, col_width, idx=0, which='left'):
-		prev_h = self.preview_size[1]
-		out_h = self.output_size[1]
-		scale = out_h / prev_h
-		dy_out = int(dy * scale)
-		heights[idx] += dy_out
-		heights[idx+1] -= dy_out
-		min_h = int(50 * scale)
-		if heights[idx] < min_h or heights[idx+1] < min_h:
-			return
-		y_positions = [0]
-		for i in range(n-1):
-			y_positions.append(y_positions[-1] + heights[i])
-		for i in range(n):
-			px, py, pw, ph = self.scale_coords((0 if tile_offset==0 else col_width), y_positions[i], col_width, heights[i])
-			self.tiles[tile_offset+i].update_size(px, py, pw, ph)
-		# Update drag bars for the correct column only
-		if n == 2:
-			px, py, pw, ph = self.scale_coords((0 if tile_offset==0 else col_width), heights[0]-5, col_width, 10)
-			if which == 'left':
-				self.drag_bars_left[0].update_position(px, py, pw, ph)
-			else:
-				self.drag_bars_right[0].update_position(px, py, pw, ph)
-		else:
-			for i in range(n-1):
-				px, py, pw, ph = self.scale_coords((0 if tile_offset==0 else col_width), heights[i]-5+y_positions[i], col_width, 10)
-				if which == 'left':
-					self.drag_bars_left[i].update_position(px, py, pw, ph)
-				else:
-					self.drag_bars_right[i].update_position(px, py, pw, ph)
-
-	def init_three_vertical(self):
-		w, h = self.output_size
-		# Initial heights: equal split
-		heights = [h//3, h//3, h - 2*(h//3)]
-		y_positions = [0, heights[0], heights[0]+heights[1]]
-		for i in range(3):
-			# Use preview coordinates
-			px, py, pw, ph = self.scale_coords(0, y_positions[i], w, heights[i])
-			tile = Tile(self.canvas, px, py, pw, ph, i, self.check_export)
-			self.tiles.append(tile)
-		# Add drag bars between tiles
-		for i in range(2):
-			px, py, pw, ph = self.scale_coords(0, y_positions[i]+heights[i]-5, w, 10)
-			bar = VerticalDragBar(self.canvas, px, py, pw, ph, lambda dy, idx=i: self.resize_tiles(idx, dy))
-			self.drag_bars.append(bar)
+	def drag_divider(self, i, delta):
+		# delta is in preview pixels along the divider's split direction
+		divider = layout_dividers(self.layout, self.output_size)[i]
+		axis = 0 if divider.direction == 'cols' else 1
+		scale = self.output_size[axis] / self.preview_size[axis]
+		layout = move_divider(self.layout, divider, delta * scale, min_size=50 * scale)
+		if layout is not None:
+			self.layout = layout
+			self.schedule_redraw()
 
-	def resize_tiles(self, idx, dy):
-		# idx: drag bar between tile idx and idx+1
-		# Convert dy from preview to output size
-		prev_h = self.preview_size[1]
-		out_h = self.output_size[1]
-		scale = out_h / prev_h
-		dy_out = int(dy * scale)
-		w, h = self.output_size
-		heights = [self.tiles[i].h for i in range(3)]
-		# Map preview heights to output heights
-		for i in range(3):
-			_, _, _, ph = self.inv_scale_coords(0, 0, 0, self.tiles[i].h)
-			heights[i] = ph
-		heights[idx] += dy_out
-		heights[idx+1] -= dy_out
-		min_h = int(50 * scale)
-		if heights[idx] < min_h or heights[idx+1] < min_h:
-			return
-		y_positions = [0, heights[0], heights[0]+heights[1]]
-		for i in range(3):
-			px, py, pw, ph = self.scale_coords(0, y_positions[i], w, heights[i])
-			self.tiles[i].update_size(px, py, pw, ph)
-		for i in range(2):
-			px, py, pw, ph = self.scale_coords(0, y_positions[i]+heights[i]-5, w, 10)
-			self.drag_bars[i].update_position(px, py, pw, ph)
-	def redraw_tiles(self):
-		# Redraw all tiles and drag bars on resize, layout-aware
-		w, h = self.output_size
-		layout = getattr(self, 'current_layout', None)
-		if layout is None:
-			# Try to infer layout from tile count
-			n = len(self.tiles)
-			if n == 3:
-				layout = '3-vertical'
-			elif n == 4:
-				layout = '4-vertical' if len(getattr(self, 'drag_bars', [])) == 3 else '4-grid'
-			elif n == 5:
-				layout = '5-2-3' if hasattr(self, 'drag_bars_left') else '5-3-2'
-			else:
-				return
-		if layout == '3-vertical':
-			heights = [self.tiles[i].h for i in range(3)]
-			for i in range(3):
-				_, _, _, ph = self.inv_scale_coords(0, 0, 0, self.tiles[i].h)
-				heights[i] = ph
-			y_positions = [0, heights[0], heights[0]+heights[1]]
-			for i in range(3):
-				px, py, pw, ph = self.scale_coords(0, y_positions[i], w, heights[i])
-				self.tiles[i].update_size(px, py, pw, ph)
-			for i in range(2):
-				px, py, pw, ph = self.scale_coords(0, y_positions[i]+heights[i]-5, w, 10)
-				self.drag_bars[i].update_position(px, py, pw, ph)
-		elif layout == '4-vertical':
-			n = 4
-			heights = [self.tiles[i].h for i in range(n)]
-			for i in range(n):
-				_, _, _, ph = self.inv_scale_coords(0, 0, 0, self.tiles[i].h)
-				heights[i] = ph
-			y_positions = [0]
-			for i in range(n-1):
-				y_positions.append(y_positions[-1] + heights[i])
-			for i in range(n):
-				px, py, pw, ph = self.scale_coords(0, y_positions[i], w, heights[i])
-				self.tiles[i].update_size(px, py, pw, ph)
-			for i in range(n-1):
-				px, py, pw, ph = self.scale_coords(0, y_positions[i]+heights[i]-5, w, 10)
-				self.drag_bars[i].update_position(px, py, pw, ph)
-		elif layout == '4-grid':
-			# 2x2 grid
-			widths = [self.tiles[0].w, self.tiles[1].w]
-			heights = [self.tiles[0].h, self.tiles[2].h]
-			for i in range(2):
-				_, _, pw, _ = self.inv_scale_coords(0, 0, self.tiles[i].w, 0)
-				widths[i] = pw
-			for i in range(2):
-				_, _, _, ph = self.inv_scale_coords(0, 0, 0, self.tiles[i*2].h)
-				heights[i] = ph
-			positions = [
-				(0, 0, widths[0], heights[0]),
-				(widths[0], 0, widths[1], heights[0]),
-				(0, heights[0], widths[0], heights[1]),
-				(widths[0], heights[0], widths[1], heights[1])
-			]
-			for i, (x, y, tw, th) in enumerate(positions):
-				px, py, pw, ph = self.scale_coords(x, y, tw, th)
-				self.tiles[i].update_size(px, py, pw, ph)
-			# Drag bars: 0 = vertical, 1 = horizontal
-			px, py, pw, ph = self.scale_coords(widths[0]-5, 0, 10, h)
-			self.drag_bars[0].update_position(px, py, pw, ph)
-			px, py, pw, ph = self.scale_coords(0, heights[0]-5, w, 10)
-			self.drag_bars[1].update_position(px, py, pw, ph)
-		elif layout == '5-2-3':
-			wcol = w // 2
-			h_left = [self.tiles[0].h, self.tiles[1].h]
-			h_right = [self.tiles[2].h, self.tiles[3].h, self.tiles[4].h]
-			for i in range(2):
-				_, _, _, ph = self.inv_scale_coords(0, 0, 0, self.tiles[i].h)
-				h_left[i] = ph
-			for i in range(3):
-				_, _, _, ph = self.inv_scale_coords(0, 0, 0, self.tiles[i+2].h)
-				h_right[i] = ph
-			# Left column
-			y_left = [0, h_left[0]]
-			for i in range(2):
-				px, py, pw, ph = self.scale_coords(0, (0 if i==0 else y_left[i-1]), wcol, h_left[i])
-				self.tiles[i].update_size(px, py, pw, ph)
-			# Right column
-			y_right = [0, h_right[0], h_right[0]+h_right[1]]
-			for i in range(3):
-				px, py, pw, ph = self.scale_coords(wcol, y_right[i], w-wcol, h_right[i])
-				self.tiles[i+2].update_size(px, py, pw, ph)
-			# Drag bars
-			# Left
-			px, py, pw, ph = self.scale_coords(0, h_left[0]-5, wcol, 10)
-			self.drag_bars_left[0].update_position(px, py, pw, ph)
-			# Right
-			for i in range(2):
-				px, py, pw, ph = self.scale_coords(wcol, h_right[i]-5+sum(h_right[:i]), w-wcol, 10)
-				self.drag_bars_right[i].update_position(px, py, pw, ph)
-		elif layout == '5-3-2':
-			wcol = w // 2
-			h_left = [self.tiles[0].h, self.tiles[1].h, self.tiles[2].h]
-			h_right = [self.tiles[3].h, self.tiles[4].h]
-			for i in range(3):
-				_, _, _, ph = self.inv_scale_coords(0, 0, 0, self.tiles[i].h)
-				h_left[i] = ph
-			for i in range(2):
-				_, _, _, ph = self.inv_scale_coords(0, 0, 0, self.tiles[i+3].h)
-				h_right[i] = ph
-			# Left column
-			y_left = [0]
-			for i in range(2):
-				y_left.append(y_left[-1] + h_left[i])
-			for i in range(3):
-				px, py, pw, ph = self.scale_coords(0, y_left[i], wcol, h_left[i])
-				self.tiles[i].update_size(px, py, pw, ph)
-			# Right column
-			y_right = [0, h_right[0]]
-			for i in range(2):
-				px, py, pw, ph = self.scale_coords(wcol, y_right[i], w-wcol, h_right[i])
-				self.tiles[i+3].update_size(px, py, pw, ph)
-			# Drag bars
-			for i in range(2):
-				px, py, pw, ph = self.scale_coords(0, h_left[i]-5+y_left[i], wcol, 10)
-				self.drag_bars_left[i].update_position(px, py, pw, ph)
-			px, py, pw, ph = self.scale_coords(wcol, h_right[0]-5, w-wcol, 10)
-			self.drag_bars_right[0].update_position(px, py, pw, ph)
+	def schedule_redraw(self):
+		# Coalesce bursts of motion/resize events into one fast redraw per
+		# frame, and push the high-quality pass back until they stop
+		if self._frame_job is None:
+			self._frame_job = self.after(FRAME_MS, self._redraw_frame)
+		if self._settle_job is not None:
+			self.after_cancel(self._settle_job)
+		self._settle_job = self.after(SETTLE_MS, self.finish_redraw)
+
+	def _redraw_frame(self):
+		self._frame_job = None
+		self.redraw_tiles(fast=True)
+
+	def finish_redraw(self):
+		for job in (self._frame_job, self._settle_job):
+			if job is not None:
+				self.after_cancel(job)
+		self._frame_job = self._settle_job = None
+		self.redraw_tiles()
+
+	def redraw_tiles(self, fast=False):
+		# Re-place all tiles and drag bars from the current layout
+		for tile, rect in zip(self.tiles, compile_layout(self.layout, self.output_size)):
+			tile.update_size(*self.scale_coords(*rect), fast=fast)
+		for bar, divider in zip(self.drag_bars, layout_dividers(self.layout, self.output_size)):
+			bar.update_position(*self.scale_coords(*self.bar_rect(divider)))
 
 	def check_export(self):
 		self.images_imported = sum(1 for tile in self.tiles if tile.image_path)
-		if self.images_imported == len(self.tiles):
+		if self.images_imported == len(self.tiles) and not self.exporting:
 			self.export_btn.config(state='normal')
 		else:
 			self.export_btn.config(state='disabled')
 
 	def export_collage(self):
-		image_paths = [tile.image_path for tile in self.tiles]
-		# Map preview tile positions to output positions
-		positions = []
-		for tile in self.tiles:
-			x, y, w, h = tile.x, tile.y, tile.w, tile.h
-			ox, oy, ow, oh = self.inv_scale_coords(x, y, w, h)
-			positions.append((ox, oy, ow, oh))
-		collage = compose_collage(image_paths, positions, self.output_size)
-		path = filedialog.asksaveasfilename(defaultextension='.jpg', filetypes=[('JPEG', '*.jpg')])
-		if path:
-			collage.save(path)
-			messagebox.showinfo('Export', f'Collage saved to {path}')
+		path = filedialog.asksaveasfilename(defaultextension='.jpg', filetypes=[('JPEG', '*.jpg'), ('PNG', '*.png'), ('WebP', '*.webp'), ('AVIF', '*.avif')])
+		if not path:
+			return
+		# Render from the layout model and the pyramids the tiles already hold
+		sources = [tile.pyramid for tile in self.tiles]
+		infos = [tile.info for tile in self.tiles]
+		positions = compile_layout(self.layout, self.output_size)
+		def work(task):
+			# Resizing is most of the work; the last tenth is the encode
+			progress = lambda done, total: task.progress(0.9 * done / total)
+			collage = self.composition.render(sources, positions, self.output_size, cache=self.tile_cache, infos=infos, fit=self.fit, crop=self.crop, progress=progress)
+			return path, save_image(collage, path, preset=self.preset, target_size=self.target_size)
+		self.exporting = True
+		self.export_btn.config(state='disabled', text='Exporting...')
+		self.export_progress['value'] = 0
+		self.export_progress.pack(side='bottom', fill='x', before=self.export_btn)
+		self.tasks.submit(work, with_task=True, on_done=self._exported, on_error=self._export_failed, on_progress=self._export_progress)
+
+	def _export_progress(self, fraction):
+		if self.winfo_exists():
+			self.export_progress['value'] = fraction
+
+	def _export_finished(self):
+		self.exporting = False
+		self.export_progress.pack_forget()
+		self.export_btn.config(text='Export')
+		self.check_export()
+
+	def _exported(self, result):
+		path, encoded = result
+		if self.winfo_exists():
+			self._export_finished()
+			messagebox.showinfo('Export', f'Collage saved to {path}\n{encoded.nbytes / 1024:.0f} KiB, encoded in {encoded.seconds * 1000:.0f} ms')
+
+	def _export_failed(self, error):
+		if self.winfo_exists():
+			self._export_finished()
+			messagebox.showerror('Export', f'Could not export collage:\n{error}')
 
 class LayoutSelector(tk.Tk):
 	def __init__(self):
 		super().__init__()
 		self.title('Choose Collage Layout')
-		self.geometry('400x300')
+		# Shared by all collage windows so re-exports reuse resized tiles
+		self.tile_cache = TileCache()
+		# Decoding and exporting run here, off the Tk thread
+		self.tasks = TaskRunner(self)
+		self.geometry('400x380')
 		self.selected_layout = tk.StringVar()
-		layouts = ['3-vertical', '4-vertical', '4-grid', '5-2-3', '5-3-2']
-		for i, layout in enumerate(layouts):
+		for layout in LAYOUTS:
 			btn = tk.Radiobutton(self, text=layout, variable=self.selected_layout, value=layout)
 			btn.pack(anchor='w', padx=20, pady=10)
 		# Add size entry
@@ -534,6 +340,24 @@ class LayoutSelector(tk.Tk):
 		self.size_entry = tk.Entry(size_frame)
 		self.size_entry.insert(0, f'{DEFAULT_OUTPUT_SIZE[0]}x{DEFAULT_OUTPUT_SIZE[1]}')
 		self.size_entry.pack(side='left')
+		# Fit and crop modes
+		fit_frame = tk.Frame(self)
+		fit_frame.pack()
+		tk.Label(fit_frame, text='Fit:').pack(side='left')
+		self.fit_var = tk.StringVar(value='stretch')
+		tk.OptionMenu(fit_frame, self.fit_var, *FIT_MODES).pack(side='left')
+		tk.Label(fit_frame, text='Crop:').pack(side='left')
+		self.crop_var = tk.StringVar(value='center')
+		tk.OptionMenu(fit_frame, self.crop_var, *CROP_MODES).pack(side='left')
+		# Encoder preset and optional target file size
+		encode_frame = tk.Frame(self)
+		encode_frame.pack()
+		tk.Label(encode_frame, text='Preset:').pack(side='left')
+		self.preset_var = tk.StringVar(value='fast')
+		tk.OptionMenu(encode_frame, self.preset_var, *PRESETS).pack(side='left')
+		tk.Label(encode_frame, text='Max size:').pack(side='left')
+		self.target_entry = tk.Entry(encode_frame, width=8)
+		self.target_entry.pack(side='left')
 		start_btn = tk.Button(self, text='Start', command=self.start_collage)
 		start_btn.pack(pady=20)
 
@@ -550,7 +374,13 @@ class LayoutSelector(tk.Tk):
 		except Exception:
 			messagebox.showwarning('Invalid Size', 'Please enter size as WxH, e.g. 1080x1920')
 			return
-		CollageWindow(self, layout, output_size)
+		target = self.target_entry.get().strip()
+		try:
+			target_size = parse_file_size(target) if target else None
+		except ValueError:
+			messagebox.showwarning('Invalid Size', 'Please enter the maximum file size in bytes or with a K/M suffix, e.g. 300K')
+			return
+		CollageWindow(self, layout, output_size, self.tasks, self.tile_cache, self.fit_var.get(), self.crop_var.get(), self.preset_var.get(), target_size)
 
 if __name__ == '__main__':
 	LayoutSelector().mainloop()
@@ -0,0 +1,36 @@
+import argparse
+import sys
+from collage.store import SourceStore
+from config import SOURCE_STORE
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-decode source images into a memory-mappable store.')
+    parser.add_argument('images', nargs='+', help='Paths to images')
+    parser.add_argument('--store', metavar='DIR', default=SOURCE_STORE, required=SOURCE_STORE is None, help='Store directory')
+    parser.add_argument('--levels', default='1,2,4', help='Comma-separated reduction levels to store (1 = full size)')
+    args = parser.parse_args()
+
+    try:
+        levels = [int(level) for level in args.levels.split(',')]
+        if min(levels) < 1:
+            raise ValueError
+    except ValueError:
+        print('Levels are positive integers, e.g. 1,2,4')
+        sys.exit(1)
+    store = SourceStore(args.store)
+    failed = 0
+    for path in args.images:
+        try:
+            sizes = store.ingest(path, levels)
+        except OSError as e:
+            print(f'{path}: {e}', file=sys.stderr)
+            failed += 1
+            continue
+        print(f"{path}: {', '.join(f'{w}x{h}' for w, h in sizes)}")
+    store.save_index()
+    print(f'{len(args.images) - failed}/{len(args.images)} images stored in {args.store}')
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+"""
+A small HTTP render service on asyncio and the standard library.
+
+    POST /render   JSON render spec, answered with the encoded collage
+    GET  /stats    queue depth, counters and latency percentiles as JSON
+
+A render spec looks like:
+
+    {"style": "4-grid", "images": ["a.jpg", {"data": "<base64>"}, ...],
+     "size": "1080x1920", "format": "webp", "preset": "web",
+     "fit": "cover", "crop": "center", "target_size": "300K"}
+
+Image paths are resolved inside the server's root directory; uploaded
+images are base64 encoded. Renders run on a bounded worker pool. When too
+many are pending, new ones get 429. Identical specs in flight share one
+render, and finished outputs are cached by spec hash, which doubles as
+the ETag: the hash covers the images' identities, so it changes whenever
+the output would.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+from collage.api import render_collage
+from collage.batch import percentile
+from collage.cache import file_identity
+from collage.crop import CROP_MODES, FIT_MODES
+from collage.encode import PRESETS, format_for_path, parse_file_size
+from collage.layouts import STYLES
+from collage.renderer import EXECUTORS
+from collage.utils import parse_size
+from config import DEFAULT_OUTPUT_SIZE
+
+MAX_BODY = 64 * 2**20
+MAX_HEADER = 64 * 2**10
+
+REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 429: 'Too Many Requests', 500: 'Internal Server Error',
+           503: 'Service Unavailable'}
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+def parse_spec(body: bytes, root: str) -> Tuple[str, tuple]:
+    """
+    Validates a JSON render spec and returns (spec hash, render arguments).
+    The hash covers every option and the identity of every image (path,
+    mtime and size, or a SHA-256 of uploaded bytes).
+    """
+    try:
+        spec = json.loads(body)
+        style = spec['style']
+        images = spec['images']
+    except (ValueError, KeyError, TypeError):
+        raise HTTPError(400, 'Expected a JSON object with style and images')
+    if style not in STYLES:
+        raise HTTPError(400, f'Unknown style: {style}')
+    if not isinstance(images, list) or not images:
+        raise HTTPError(400, 'images must be a non-empty list')
+    try:
+        output_size = parse_size(spec['size']) if spec.get('size') else DEFAULT_OUTPUT_SIZE
+        target = spec.get('target_size')
+        target_size = parse_file_size(str(target)) if target else None
+    except (ValueError, TypeError):
+        raise HTTPError(400, 'Invalid size or target_size')
+    fmt = format_for_path('output.' + str(spec.get('format', 'jpeg')).lower(), None)
+    preset = spec.get('preset', 'fast')
+    fit = spec.get('fit', 'stretch')
+    crop = spec.get('crop', 'center')
+    if fmt is None or preset not in PRESETS or fit not in FIT_MODES or crop not in CROP_MODES:
+        raise HTTPError(400, 'Invalid format, preset, fit or crop')
+    sources, identities = [], []
+    real_root = os.path.realpath(root)
+    for image in images:
+        if isinstance(image, str):
+            path = os.path.realpath(os.path.join(real_root, image))
+            if os.path.commonpath([real_root, path]) != real_root:
+                raise HTTPError(400, f'Image outside the server root: {image}')
+            try:
+                identities.append(file_identity(path))
+            except OSError:
+                raise HTTPError(400, f'No such image: {image}')
+            sources.append(path)
+        elif isinstance(image, dict) and isinstance(image.get('data'), str):
+            try:
+                data = base64.b64decode(image['data'], validate=True)
+            except ValueError:
+                raise HTTPError(400, 'Invalid base64 image data')
+            identities.append(('sha256', hashlib.sha256(data).hexdigest()))
+            sources.append(data)
+        else:
+            raise HTTPError(400, 'Images are paths or {"data": base64} objects')
+    args = (style, output_size, fmt, preset, target_size, fit, crop)
+    key = hashlib.sha256(json.dumps([args, identities]).encode()).hexdigest()
+    return key, (sources,) + args
+
+def _render(sources: list, style: str, output_size: Tuple[int, int], fmt: str, preset: str, target_size: Optional[int], fit: str, crop: str) -> bytes:
+    # Runs in a pool worker
+    data, _ = render_collage(sources, style, output_size, fmt, preset, target_size, fit, crop)
+    return data
+
+def _ready() -> bool:
+    return True
+
+class RenderServer:
+    def __init__(self, root: str = '.', workers: int = 1, executor: str = 'process', max_pending: Optional[int] = None, cache_bytes: int = 64 * 2**20):
+        self.root = root
+        self.workers = workers
+        self.pool = EXECUTORS[executor](max_workers=workers)
+        self.max_pending = max_pending or 4 * workers
+        self.cache_bytes = cache_bytes
+        self.cache: 'OrderedDict[str, Tuple[bytes, str]]' = OrderedDict()
+        self.cache_nbytes = 0
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.latencies = deque(maxlen=1000)
+        self.counters = {'requests': 0, 'renders': 0, 'coalesced': 0, 'cache_hits': 0, 'not_modified': 0, 'rejected': 0, 'errors': 0}
+
+    def stats(self) -> dict:
+        latencies = list(self.latencies)
+        return {
+            'queue_depth': len(self.inflight),
+            'max_pending': self.max_pending,
+            **self.counters,
+            'cache': {'entries': len(self.cache), 'bytes': self.cache_nbytes},
+            'latency_ms': {f'p{p}': percentile(latencies, p) * 1000 for p in (50, 95, 99)},
+        }
+
+    def _cache_put(self, key: str, entry: Tuple[bytes, str]):
+        size = len(entry[0])
+        if size > self.cache_bytes:
+            return
+        self.cache[key] = entry
+        self.cache_nbytes += size
+        while self.cache_nbytes > self.cache_bytes:
+            _, (data, _) = self.cache.popitem(last=False)
+            self.cache_nbytes -= len(data)
+
+    async def render(self, key: str, args: tuple) -> Tuple[bytes, str]:
+        """
+        Returns (data, content type) for a parsed spec, from the cache, from
+        an identical render in flight, or from a new render on the pool.
+        """
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.cache.move_to_end(key)
+            self.counters['cache_hits'] += 1
+            return entry
+        future = self.inflight.get(key)
+        if future is not None:
+            self.counters['coalesced'] += 1
+            return await asyncio.shield(future)
+        if len(self.inflight) >= self.max_pending:
+            self.counters['rejected'] += 1
+            raise HTTPError(429, 'Too many renders pending, retry later')
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.inflight[key] = future
+        self.counters['renders'] += 1
+        try:
+            data = await loop.run_in_executor(self.pool, _render, *args)
+            entry = (data, Image.MIME.get(args[3], 'application/octet-stream'))
+            self._cache_put(key, entry)
+            future.set_result(entry)
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters retrieve it; mark it retrieved for the case there are none
+            future.exception()
+            raise
+        finally:
+            del self.inflight[key]
+            if not future.done():
+                # Cancelled (e.g. at shutdown): fail coalesced waiters too
+                future.set_exception(HTTPError(503, 'Render cancelled'))
+                future.exception()
+        return entry
+
+    async def respond(self, method: str, path: str, headers: Dict[str, str], body: bytes) -> Tuple[int, Dict[str, str], bytes]:
+        if path == '/stats':
+            if method != 'GET':
+                raise HTTPError(405, 'Use GET')
+            return 200, {'Content-Type': 'application/json'}, json.dumps(self.stats()).encode()
+        if path != '/render':
+            raise HTTPError(404, f'No such endpoint: {path}')
+        if method != 'POST':
+            raise HTTPError(405, 'Use POST')
+        start = time.perf_counter()
+        key, args = parse_spec(body, self.root)
+        # The hash pins down the output, so a matching ETag needs no render
+        etag = f'"{key}"'
+        if headers.get('if-none-match') == etag:
+            self.counters['not_modified'] += 1
+            return 304, {'ETag': etag}, b''
+        try:
+            data, content_type = await self.render(key, args)
+        except (ValueError, OSError) as e:
+            raise HTTPError(400, f'{type(e).__name__}: {e}')
+        self.latencies.append(time.perf_counter() - start)
+        return 200, {'Content-Type': content_type, 'ETag': etag}, data
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # One request per connection
+        try:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except asyncio.LimitOverrunError:
+                raise HTTPError(413, 'Request header too large')
+            request_line, *lines = head.decode('latin-1').split('\r\n')
+            method, target, _ = request_line.split(' ', 2)
+            headers = {}
+            for line in lines:
+                if ':' in line:
+                    name, value = line.split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length', 0))
+            if length < 0:
+                raise ValueError(f'Negative Content-Length: {length}')
+            if length > MAX_BODY:
+                raise HTTPError(413, 'Request body too large')
+            body = await reader.readexactly(length) if length else b''
+            self.counters['requests'] += 1
+            status, out_headers, payload = await self.respond(method, target.split('?', 1)[0], headers, body)
+        except HTTPError as e:
+            status, out_headers, payload = e.status, {'Content-Type': 'application/json'}, json.dumps({'error': str(e)}).encode()
+            if e.status == 429:
+                out_headers['Retry-After'] = '1'
+        except ValueError:
+            # A malformed request line, header or Content-Length
+            status, out_headers, payload = 400, {'Content-Type': 'application/json'}, json.dumps({'error': 'Malformed request'}).encode()
+        except asyncio.IncompleteReadError:
+            writer.close()
+            return
+        except Exception as e:
+            self.counters['errors'] += 1
+            status, out_headers, payload = 500, {'Content-Type': 'application/json'}, json.dumps({'error': f'{type(e).__name__}: {e}'}).encode()
+        lines = [f'HTTP/1.1 {status} {REASONS[status]}', f'Content-Length: {len(payload)}', 'Connection: close']
+        lines += [f'{name}: {value}' for name, value in out_headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + payload)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8080) -> asyncio.AbstractServer:
+        # Start the workers before accepting connections: forked workers
+        # would otherwise inherit the socket of the request that started
+        # them and keep it open after the response
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.pool, _ready) for _ in range(self.workers)])
+        return await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER)
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve collage renders over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser.add_argument('--root', default='.', help='Directory that image paths in specs are resolved in')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='Number of renders run in parallel')
+    parser.add_argument('--executor', choices=['thread', 'process'], default='process', help='Worker pool for renders')
+    parser.add_argument('--max-pending', type=int, default=None, help='Renders queued or running before new ones get 429 (default 4 per job)')
+    parser.add_argument('--cache-mb', type=int, default=64, help='Memory budget of the rendered output cache in MiB')
+    args = parser.parse_args()
+
+    server = RenderServer(args.root, args.jobs, args.executor, args.max_pending, args.cache_mb * 2**20)
+
+    async def serve():
+        listener = await server.start(args.host, args.port)
+        print(f'Serving on http://{args.host}:{args.port}')
+        async with listener:
+            await listener.serve_forever()
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+if __name__ == '__main__':
+    main()
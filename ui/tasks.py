@@ -0,0 +1,79 @@
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+class Task:
+	# Handle for work submitted to a TaskRunner. A cancelled task's result
+	# is dropped instead of being delivered to the Tk thread.
+	def __init__(self, runner, on_done, on_error, on_progress):
+		self.runner = runner
+		self.on_done = on_done
+		self.on_error = on_error
+		self.on_progress = on_progress
+		self.cancelled = False
+		self.future = None
+
+	def cancel(self):
+		self.cancelled = True
+		if self.future is not None and self.future.cancel():
+			# Never going to run; account for it like a finished task
+			self.runner.results.put((self, 'cancelled', None))
+
+	def progress(self, *args):
+		# Safe to call from the worker thread
+		if not self.cancelled:
+			self.runner.results.put((self, 'progress', args))
+
+class TaskRunner:
+	# Runs decode/resize/export work on a thread pool so the Tk mainloop never
+	# blocks. Results are queued by the workers and handed to the callbacks
+	# on the Tk thread by polling the queue with after() while work is pending.
+	def __init__(self, widget, workers=4, poll_ms=30):
+		self.widget = widget
+		self.poll_ms = poll_ms
+		self.pool = ThreadPoolExecutor(max_workers=workers)
+		self.results = queue.Queue()
+		self.pending = 0
+		self._poll_job = None
+
+	def submit(self, fn, *args, on_done=None, on_error=None, on_progress=None, with_task=False):
+		# With with_task, fn receives the Task as its first argument so it can
+		# report progress
+		task = Task(self, on_done, on_error, on_progress)
+		call_args = (task,) + args if with_task else args
+		task.future = self.pool.submit(self._run, task, fn, call_args)
+		self.pending += 1
+		if self._poll_job is None:
+			self._poll_job = self.widget.after(self.poll_ms, self._poll)
+		return task
+
+	def _run(self, task, fn, args):
+		if task.cancelled:
+			self.results.put((task, 'cancelled', None))
+			return
+		try:
+			self.results.put((task, 'done', fn(*args)))
+		except Exception as e:
+			self.results.put((task, 'error', e))
+
+	def _poll(self):
+		self._poll_job = None
+		while True:
+			try:
+				task, kind, value = self.results.get_nowait()
+			except queue.Empty:
+				break
+			if kind != 'progress':
+				self.pending -= 1
+			if task.cancelled:
+				continue
+			if kind == 'done' and task.on_done:
+				task.on_done(value)
+			elif kind == 'error' and task.on_error:
+				task.on_error(value)
+			elif kind == 'progress' and task.on_progress:
+				task.on_progress(*value)
+		if self.pending > 0:
+			self._poll_job = self.widget.after(self.poll_ms, self._poll)
+
+	def shutdown(self):
+		self.pool.shutdown(wait=False, cancel_futures=True)